@@ -1,36 +1,49 @@
 import re
 
+# طي الحروف: كل حرف يُستبدل بحرف واحد أو يُحذف (None)
+_CHARACTER_FOLDS = {
+    # تطبيع الهمزات - الأهم
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا',
+    # تطبيع الياء
+    'ى': 'ي',
+    # تطبيع التاء المربوطة
+    'ة': 'ه',
+    # تطبيع الهمزة على الواو والياء
+    'ؤ': 'و',
+    'ئ': 'ي',
+}
+
+# إزالة التشكيل والتطويل
+_REMOVED_CHARACTERS = [chr(code) for code in range(0x064B, 0x0653)] + ['ٰ', 'ـ']
+
+_TRANSLATION_TABLE = str.maketrans({
+    **_CHARACTER_FOLDS,
+    **{char: None for char in _REMOVED_CHARACTERS},
+})
+
+# تطبيع المسافات
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
 class ArabicNormalizer:
     """مطبع النصوص العربية المتقدم"""
-    
+
     def __init__(self):
-        self.normalization_rules = {
-            # تطبيع الهمزات - الأهم
-            r'[أإآا]': 'ا',
-            # تطبيع الياء
-            r'ى': 'ي',
-            # تطبيع التاء المربوطة
-            r'ة': 'ه',
-            # تطبيع الهمزة على الواو والياء
-            r'ؤ': 'و',
-            r'ئ': 'ي',
-            # إزالة التشكيل
-            r'[\u064B-\u0652\u0670\u0640]': '',
-            # تطبيع المسافات
-            r'\s+': ' '
-        }
-    
+        # جدول التحويل والنمط مبنيان مرة واحدة على مستوى الوحدة
+        self.translation_table = _TRANSLATION_TABLE
+        self.whitespace_pattern = _WHITESPACE_PATTERN
+
     def normalize(self, text):
         """تطبيع النص العربي"""
         if not text:
             return ""
-        
-        # تطبيق قواعد التطبيع
-        for pattern, replacement in self.normalization_rules.items():
-            text = re.sub(pattern, replacement, text)
-        
+
+        # طي الحروف وإزالة التشكيل في مرور واحد ثم توحيد المسافات
+        text = text.translate(self.translation_table)
+        text = self.whitespace_pattern.sub(' ', text)
+
         return text.strip().lower()
-    
+
     def normalize_keywords(self, keywords_list):
         """تطبيع قائمة من الكلمات المفتاحية"""
         return [self.normalize(keyword) for keyword in keywords_list]
@@ -0,0 +1,91 @@
+import threading
+
+# السوابق من الأطول للأقصر، تُحذف واحدة فقط
+_PREFIXES = ("وال", "بال", "فال", "كال", "لل", "ال")
+# حروف العطف والجر المتصلة: تُحذف فقط إذا بقيت كلمة طويلة بعدها
+_LETTER_PREFIXES = ("و", "ف", "ل")
+# اللواحق (بعد التطبيع التاء المربوطة هاء)، تُحذف متتالية
+_SUFFIXES = ("ها", "ات", "ين", "ه")
+
+# أقصر جذع مقبول بعد الحذف
+MIN_STEM_LENGTH = 3
+# أقصر جذع بعد حذف حرف سابق واحد (كثير من الكلمات تبدأ بهذه الحروف أصلاً)
+MIN_LETTER_PREFIX_STEM_LENGTH = 4
+
+DEFAULT_CACHE_SIZE = 50000
+
+
+class ArabicLightStemmer:
+    """مجذع عربي خفيف: حذف السوابق واللواحق الشائعة من الكلمات المطبعة
+
+    النتائج محفوظة في ذاكرة محدودة الحجم لكل كلمة، فالكلمة المتكررة
+    تكلف بحثاً واحداً في قاموس. عند الامتلاء يُحذف أقدم عنصر.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def stem(self, token):
+        """جذع كلمة مطبعة واحدة"""
+        cached = self.cache.get(token)
+        if cached is not None:
+            return cached
+
+        stem = self.strip_affixes(token)
+        with self._lock:
+            if len(self.cache) >= self.cache_size:
+                self.cache.pop(next(iter(self.cache)))
+            self.cache[token] = stem
+        return stem
+
+    def stem_text(self, normalized_text):
+        """النص المطبع بعد تجذيع كل كلماته"""
+        return " ".join(self.stem(token) for token in normalized_text.split())
+
+    def strip_affixes(self, token):
+        """حذف سابقة واحدة ثم اللواحق مع الإبقاء على جذع بالطول الأدنى"""
+        for prefix in _PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= MIN_STEM_LENGTH:
+                token = token[len(prefix):]
+                break
+        else:
+            for prefix in _LETTER_PREFIXES:
+                if token.startswith(prefix) and len(token) - 1 >= MIN_LETTER_PREFIX_STEM_LENGTH:
+                    token = token[1:]
+                    break
+
+        stripped = True
+        while stripped:
+            stripped = False
+            for suffix in _SUFFIXES:
+                if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+                    token = token[:-len(suffix)]
+                    stripped = True
+                    break
+
+        return token
+
+
+# مجذع مشترك لكل الفهارس في العملية
+_default_stemmer = ArabicLightStemmer()
+
+
+def stem(token):
+    """جذع كلمة مطبعة بالمجذع المشترك"""
+    return _default_stemmer.stem(token)
+
+
+# كلمات عامة في أسئلة صعوبات التعلم (بعد التطبيع): ترد في معظم الأسئلة والمقاطع
+# ولا تدل على موضوع، فلا تُصحح بالجذع إلى كلمة مفتاحية ولا يُبحث بها في الدليل
+GENERIC_WORDS = (
+    "مشكله", "مشاكل", "مشكلات", "صعوبه", "صعوبات", "تعلم", "التعلم",
+    "طفل", "اطفال", "نوع", "انواع", "حاجه",
+)
+GENERIC_STEMS = frozenset(stem(word) for word in GENERIC_WORDS)
+
+
+def is_generic(token):
+    """هل الكلمة المطبعة صيغة من كلمة عامة (بجذعها)"""
+    return stem(token) in GENERIC_STEMS
@@ -0,0 +1,222 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from arabic_normlizer import ArabicNormalizer
+from conversation_history import ConversationHistory
+from knowledge_base import SpecializedKnowledgeBase, default_index_path
+from question_intent_analyzer import QuestionIntentAnalyzer
+from respond_handler import AdvancedResponseHandler
+from response_cache import ResponseCache
+
+# نسبة الزيادة المسموحة في زمن الاستجابة قبل اعتبارها تراجعاً
+DEFAULT_TOLERANCE = 0.25
+# المقاييس التي تُقارن بالأساس (p99 يتأثر كثيراً بضوضاء الجهاز فيُعرض فقط)
+COMPARED_METRICS = ("p50_us", "p95_us")
+
+
+def load_questions(path):
+    """أسئلة المقارنة: سؤال في كل سطر، والأسطر الفارغة تُتجاهل"""
+    with open(path, encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def percentile(sorted_values, fraction):
+    """قيمة النسبة المئوية بطريقة أقرب رتبة"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def build_stages(knowledge_base):
+    """المراحل المقاسة: الاسم -> دالة تأخذ سؤالاً واحداً"""
+    normalizer = ArabicNormalizer()
+    analyzer = QuestionIntentAnalyzer()
+    # بدون ذاكرة مؤقتة للردود ولا تاريخ، حتى يُقاس المسار الكامل في كل مرة
+    handler = AdvancedResponseHandler(
+        knowledge_base,
+        intent_analyzer=analyzer,
+        history=ConversationHistory(max_records=0),
+        response_cache=ResponseCache(max_entries=0),
+    )
+
+    def confidence(question):
+        intent = analyzer.analyze_intent(question)
+        topic = analyzer.extract_main_topic(question)
+        return analyzer.get_confidence_score(question, intent, topic)
+
+    stages = {
+        "normalize": normalizer.normalize,
+        "analyze_intent": analyzer.analyze_intent,
+        "extract_main_topic": analyzer.extract_main_topic,
+        "get_confidence_score": confidence,
+        "analyze": analyzer.analyze,
+        "fallback_search": handler.fallback_search,
+        "process_user_input": handler.process_user_input,
+    }
+    return stages, handler
+
+
+def time_stage(func, questions, repeat, warmup):
+    """زمن كل استدعاء بالميكروثانية وإجمالي زمن الدورات المقاسة"""
+    for question in questions[:warmup]:
+        func(question)
+
+    samples = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for _ in range(repeat):
+        for question in questions:
+            call_started = clock()
+            func(question)
+            samples.append((clock() - call_started) / 1000)
+    elapsed = (clock() - started) / 1e9
+    return samples, elapsed
+
+
+def peak_memory(func, questions):
+    """أقصى ذاكرة بالكيلوبايت تُحجز أثناء مرور واحد على الأسئلة"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        for question in questions:
+            func(question)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - baseline) / 1024
+
+
+def answers_fingerprint(handler, questions):
+    """بصمة لمعرفات الردود حتى تُكتشف تغيرات النتائج وليس الزمن فقط"""
+    digest = hashlib.sha256()
+    for question in questions:
+        response = handler.respond(question)
+        digest.update(f"{question}\t{response.tier}\t{response.response_id}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def run_benchmarks(questions, knowledge_base, repeat=5, warmup=20, stage_names=None):
+    """قياس كل المراحل وإرجاع تقرير قابل للكتابة كـ JSON"""
+    stages, handler = build_stages(knowledge_base)
+    if stage_names:
+        stages = {name: stages[name] for name in stage_names}
+
+    results = {}
+    for name, func in stages.items():
+        samples, elapsed = time_stage(func, questions, repeat, warmup)
+        samples.sort()
+        results[name] = {
+            "calls": len(samples),
+            "mean_us": sum(samples) / len(samples),
+            "p50_us": percentile(samples, 0.50),
+            "p95_us": percentile(samples, 0.95),
+            "p99_us": percentile(samples, 0.99),
+            "throughput_per_s": len(samples) / elapsed if elapsed else 0.0,
+            "peak_memory_kb": peak_memory(func, questions),
+        }
+    fingerprint = answers_fingerprint(handler, questions)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "questions": len(questions),
+        "repeat": repeat,
+        "answers_sha256": fingerprint,
+        "stages": results,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """قائمة التراجعات مقارنة بالتقرير المحفوظ (فارغة إذا لم يوجد تراجع)"""
+    regressions = []
+    for name, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(
+                    f"{name}.{metric}: {current[metric]:.1f}µs > {previous[metric]:.1f}µs (+{tolerance:.0%})"
+                )
+
+    if baseline.get("answers_sha256") and baseline["answers_sha256"] != report["answers_sha256"]:
+        regressions.append("answers: تغيرت الردود عن التقرير المحفوظ")
+    return regressions
+
+
+def format_report(report):
+    """جدول نصي بنتائج القياس"""
+    lines = [
+        f"{'stage':<22}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}{'ops/s':>12}{'peak KB':>10}",
+    ]
+    for name, result in report["stages"].items():
+        lines.append(
+            f"{name:<22}{result['p50_us']:>10.1f}{result['p95_us']:>10.1f}{result['p99_us']:>10.1f}"
+            f"{result['throughput_per_s']:>12.0f}{result['peak_memory_kb']:>10.1f}"
+        )
+    lines.append(f"answers sha256: {report['answers_sha256'][:16]}  ({report['questions']} أسئلة × {report['repeat']})")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء مسار الإجابة عن الأسئلة")
+    parser.add_argument("--questions", default="benchmark_questions.txt", help="ملف أسئلة المقارنة")
+    parser.add_argument("--kb", default="after_cleaning.txt", help="ملف الدليل التربوي")
+    parser.add_argument("--repeat", type=int, default=5, help="عدد مرات المرور على الأسئلة لكل مرحلة")
+    parser.add_argument("--warmup", type=int, default=20, help="عدد الاستدعاءات قبل القياس")
+    parser.add_argument("--stage", action="append", dest="stages", help="قياس مرحلة محددة (يمكن تكراره)")
+    parser.add_argument("--output", "-o", help="كتابة التقرير بصيغة JSON")
+    parser.add_argument("--baseline", default="benchmark_baseline.json",
+                        help="التقرير المحفوظ للمقارنة (يُتجاهل إذا لم يوجد)")
+    parser.add_argument("--save-baseline", action="store_true", help="حفظ التقرير الحالي كأساس للمقارنة")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="نسبة الزيادة المسموحة في زمن الاستجابة")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """تشغيل القياس وطباعة التقرير؛ يرجع 1 عند وجود تراجع عن الأساس"""
+    args = parse_args(argv)
+
+    questions = load_questions(args.questions)
+    knowledge_base = SpecializedKnowledgeBase(args.kb, index_path=default_index_path(args.kb))
+    report = run_benchmarks(questions, knowledge_base, args.repeat, args.warmup, args.stages)
+
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"✅ تم حفظ الأساس: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("⚠️ تراجعات عن الأساس:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"✅ لا تراجع عن الأساس ({args.baseline})")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class ConversationRecord:
+    """سجل محادثة واحد مضغوط: الرد محفوظ بمعرفه فقط وليس بنصه
+
+    generation نسخة قاعدة المعرفة التي أجابت، لأن المعرف يُعرض لاحقاً
+    على النسخة الحالية التي قد تكون أُعيد تحميلها.
+    """
+
+    __slots__ = ("timestamp", "user_input", "response_id", "tier", "generation")
+
+    def __init__(self, timestamp, user_input, response_id, tier, generation=None):
+        self.timestamp = timestamp
+        self.user_input = user_input
+        self.response_id = response_id
+        self.tier = tier
+        self.generation = generation
+
+    def formatted_timestamp(self):
+        """الوقت بنفس الصيغة المستخدمة في واجهة المحادثة"""
+        return datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+    def to_dict(self):
+        """تحويل السجل إلى قاموس قابل للكتابة كـ JSON"""
+        return {
+            "timestamp": self.formatted_timestamp(),
+            "user_input": self.user_input,
+            "response_id": self.response_id,
+            "tier": self.tier,
+            "generation": self.generation,
+        }
+
+
+class ConversationHistory:
+    """مخزن تاريخ محادثة محدود الحجم (حلقي)
+
+    عند امتلاء المخزن يُحذف أقدم سجل، ويُكتب أولاً إلى سجل على القرص
+    (JSON Lines، إضافة فقط) إذا حُدد log_path.
+    """
+
+    def __init__(self, max_records=200, log_path=None):
+        self.max_records = max_records
+        self.log_path = log_path
+        self.records = deque()
+        self._lock = threading.Lock()
+
+    def append(self, user_input, response_id, tier, generation=None):
+        """إضافة سجل جديد وإخراج الأقدم إذا امتلأ المخزن"""
+        record = ConversationRecord(time.time(), user_input, response_id, tier, generation)
+        evicted = []
+
+        with self._lock:
+            self.records.append(record)
+            while len(self.records) > self.max_records:
+                evicted.append(self.records.popleft())
+
+        if evicted and self.log_path:
+            self.spill(evicted)
+
+        return record
+
+    def spill(self, records):
+        """كتابة السجلات المُخرجة إلى سجل القرص"""
+        with open(self.log_path, "a", encoding="utf-8") as log_file:
+            for record in records:
+                log_file.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+
+    def clear(self):
+        """مسح السجلات الموجودة في الذاكرة"""
+        with self._lock:
+            self.records.clear()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self.records))
@@ -0,0 +1,152 @@
+from fuzzy_index import SymSpellIndex
+from multi_pattern_matcher import AhoCorasickMatcher
+from tfidf_index import TfidfIndex
+
+
+class KeywordFallbackIndex:
+    """فهرس البحث الاحتياطي في مدخلات قاعدة المعرفة
+
+    الترتيب الأساسي بنقاط الفهرس المقلوب الذي يربط كل كلمة مفتاحية مطبعة
+    وكل جزء منها بالمدخلات التي تحتويها، وإذا لم تطابق أي كلمة مفتاحية
+    يُستخدم تشابه TF-IDF لحروف n مع الكلمات المفتاحية والردود.
+    """
+
+    # الكلمة المفتاحية كاملة موجودة في السؤال
+    FULL_MATCH_WEIGHT = 3
+    # كلمة من السؤال موجودة داخل الكلمة المفتاحية
+    PARTIAL_MATCH_WEIGHT = 1
+    # أقل تشابه (جيب تمام) لقبول مدخل بترتيب TF-IDF عند غياب الكلمات المفتاحية
+    MIN_SIMILARITY = 0.25
+
+    def __init__(self, knowledge_dict, normalizer):
+        # المدخلات بترتيب قاموس المعرفة: (الموضوع، النية)
+        self.entries = []
+        # رقم الكلمة المفتاحية -> رقم المدخل
+        self.keyword_entries = []
+        self.phrase_matcher = AhoCorasickMatcher()
+        # جزء من كلمة مفتاحية -> أرقام الكلمات المفتاحية التي تحتويه
+        self.substring_postings = {}
+        # كلمات الكلمات المفتاحية لتصحيح أخطاء الكتابة في السؤال
+        self.fuzzy_index = SymSpellIndex()
+        self.similarity_index = TfidfIndex()
+
+        self.build(knowledge_dict, normalizer)
+
+    def build(self, knowledge_dict, normalizer):
+        """بناء الفهرس من قاموس المعرفة"""
+        keyword_ids = {}
+        # نصوص كل مدخل المطبعة: (الكلمات المفتاحية، الرد)
+        documents = []
+
+        for topic, intents in knowledge_dict.items():
+            for intent, topic_data in intents.items():
+                entry_id = len(self.entries)
+                self.entries.append((topic, intent))
+                normalized_keywords = [normalizer.normalize(keyword) for keyword in topic_data["keywords"]]
+                documents.append((" ".join(normalized_keywords), normalizer.normalize(topic_data["response"])))
+
+                for normalized_keyword in normalized_keywords:
+                    if not normalized_keyword:
+                        continue
+                    keyword_id = len(self.keyword_entries)
+                    self.keyword_entries.append(entry_id)
+                    keyword_ids.setdefault(normalized_keyword, []).append(keyword_id)
+
+        postings = {}
+        for normalized_keyword, ids in keyword_ids.items():
+            self.phrase_matcher.add(normalized_keyword, tuple(ids))
+            for word in normalized_keyword.split():
+                self.fuzzy_index.add(word)
+
+            length = len(normalized_keyword)
+            substrings = {
+                normalized_keyword[start:end]
+                for start in range(length)
+                for end in range(start + 1, length + 1)
+            }
+            for substring in substrings:
+                postings.setdefault(substring, []).extend(ids)
+
+        self.phrase_matcher.build()
+        self.similarity_index.build(documents)
+        self.substring_postings = {
+            substring: tuple(ids) for substring, ids in postings.items()
+        }
+
+    def score_entries(self, normalized_input):
+        """حساب نقاط المدخلات التي تلمسها كلمات السؤال فقط"""
+        full_matches = set()
+        for _, _, ids in self.phrase_matcher.iter_matches(normalized_input):
+            full_matches.update(ids)
+        words = set(normalized_input.split())
+
+        # الكلمات التي ليست جزءاً من أي كلمة مفتاحية تُصحح لأقرب كلمة وتُضاف تطابقاتها
+        corrected_input, corrections = self.fuzzy_index.correct(
+            normalized_input, lambda start, end, word: word in self.substring_postings
+        )
+        if corrections:
+            for _, _, ids in self.phrase_matcher.iter_matches(corrected_input):
+                full_matches.update(ids)
+            words.update(correction.word for correction in corrections)
+
+        partial_matches = set()
+        for word in words:
+            partial_matches.update(self.substring_postings.get(word, ()))
+        partial_matches -= full_matches
+
+        scores = {}
+        for keyword_id in full_matches:
+            entry_id = self.keyword_entries[keyword_id]
+            scores[entry_id] = scores.get(entry_id, 0) + self.FULL_MATCH_WEIGHT
+        for keyword_id in partial_matches:
+            entry_id = self.keyword_entries[keyword_id]
+            scores[entry_id] = scores.get(entry_id, 0) + self.PARTIAL_MATCH_WEIGHT
+
+        return scores
+
+    def rank_keywords(self, normalized_input):
+        """ترتيب المدخلات بنقاط الكلمات المفتاحية: [(الموضوع، النية، النقاط)] من الأعلى للأقل"""
+        scores = self.score_entries(normalized_input)
+        # عند التعادل يفوز المدخل الأسبق في قاموس المعرفة
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [
+            (*self.entries[entry_id], score)
+            for entry_id, score in ranked
+            if score > 0
+        ]
+
+    def rank_similar(self, normalized_input, top_k=3):
+        """أعلى المدخلات تشابهاً: [(الموضوع، النية، التشابه)] من الأعلى للأقل"""
+        return [
+            (*self.entries[entry_id], similarity)
+            for entry_id, similarity in self.similarity_index.rank(normalized_input, top_k)
+        ]
+
+    def rank(self, normalized_input, top_k=3, intent=None):
+        """أفضل المدخلات: [(الموضوع، النية، النقاط)] من الأعلى للأقل
+
+        الترتيب بنقاط الكلمات المفتاحية (النقاط المرجعة)، وعند التعادل يفوز
+        المدخل الأسبق. إذا لم تطابق أي كلمة مفتاحية يُرتب بتشابه TF-IDF
+        (والنقاط المرجعة هي التشابه). مع نية محللة من السؤال تتقدم مدخلات
+        هذه النية على غيرها، فسؤال العلاج لا يجيبه مدخل تعريف.
+        """
+        scores = self.score_entries(normalized_input)
+        if not scores:
+            scores = {
+                entry_id: similarity
+                for entry_id, similarity in self.similarity_index.similarities(normalized_input).items()
+                if similarity >= self.MIN_SIMILARITY
+            }
+
+        def sort_key(entry_id):
+            return (self.entries[entry_id][1] != intent, -scores[entry_id], entry_id)
+
+        return [(*self.entries[entry_id], scores[entry_id]) for entry_id in sorted(scores, key=sort_key)[:top_k]]
+
+    def search(self, normalized_input, intent=None):
+        """إرجاع أفضل مدخل (الموضوع، النية) أو None"""
+        ranked = self.rank(normalized_input, top_k=1, intent=intent)
+        if ranked:
+            topic, intent, _ = ranked[0]
+            return topic, intent
+        return None
@@ -0,0 +1,174 @@
+import re
+from collections import namedtuple
+
+from arabic_stemmer import is_generic, stem
+
+_TOKEN_PATTERN = re.compile(r'\S+')
+
+# كلمة صُححت في النص: موضعها في النص الأصلي، موضعها في النص المصحح، والكلمة البديلة
+Correction = namedtuple(
+    "Correction", ["original_start", "original_end", "start", "end", "word"]
+)
+
+
+def bounded_edit_distance(source, target, max_distance):
+    """مسافة التحرير (مع تبديل حرفين متجاورين) أو None إذا تجاوزت الحد"""
+    if abs(len(source) - len(target)) > max_distance:
+        return None
+
+    previous_row = None
+    row = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        previous_row, before_previous = row, previous_row
+        row = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                row[j] = min(row[j], before_previous[j - 2] + 1)
+        if min(row) > max_distance:
+            return None
+
+    return row[-1] if row[-1] <= max_distance else None
+
+
+class SymSpellIndex:
+    """فهرس حذف (SymSpell) للبحث التقريبي في مفردات ثابتة
+
+    كل كلمة تُخزن مع كل صيغها بعد حذف حتى max_distance حرف. عند البحث
+    تُولد صيغ الحذف للكلمة المدخلة فقط وتُقارن بالكلمات التي تشترك معها
+    في صيغة، فلا تُقارن الكلمة بكل المفردات. الكلمة التي لها نفس جذع
+    كلمة من المفردات تطابقها بمسافة صفر.
+    """
+
+    # الكلمات الأقصر من ذلك تتشابه كثيراً ولا تُصحح
+    MIN_TOKEN_LENGTH = 4
+    # التصحيح بمسافة تحرير لا يكون إلا بين كلمتين بهذا الطول على الأقل: كلمات
+    # الأربعة أحرف يفصل بينها حرف واحد (حسام/حساب، حروب/حروف، سمعت/سمعي)
+    MIN_CORRECTION_LENGTH = 5
+
+    def __init__(self, words=(), max_distance=1):
+        self.max_distance = max_distance
+        self.words = []
+        self.word_ids = {}
+        # صيغة بعد الحذف -> أرقام الكلمات التي تنتجها
+        self.deletes = {}
+        # الجذع -> رقم أول كلمة به
+        self.stems = {}
+
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        """إضافة كلمة مطبعة إلى المفردات"""
+        if len(word) < self.MIN_TOKEN_LENGTH or word in self.word_ids:
+            return
+
+        word_id = len(self.words)
+        self.words.append(word)
+        self.word_ids[word] = word_id
+        self.stems.setdefault(stem(word), word_id)
+        if len(word) < self.MIN_CORRECTION_LENGTH:
+            return
+        for variant in self.delete_variants(word):
+            self.deletes.setdefault(variant, []).append(word_id)
+
+    def delete_variants(self, word):
+        """كل صيغ الكلمة بعد حذف حتى max_distance حرف (تشمل الكلمة نفسها)"""
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {
+                variant[:position] + variant[position + 1:]
+                for variant in frontier
+                for position in range(len(variant))
+            }
+            variants |= frontier
+        return variants
+
+    def __contains__(self, word):
+        return word in self.word_ids
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup(self, token):
+        """أقرب كلمات المفردات [(الكلمة، المسافة)] من الأقرب للأبعد"""
+        if len(token) < self.MIN_TOKEN_LENGTH:
+            return []
+        if token in self.word_ids:
+            return [(token, 0)]
+        # الكلمات العامة (المشكلة، الاطفال...) لا تُصحح إلى كلمة مفتاحية بجذعها أو بقربها
+        if is_generic(token):
+            return []
+        stem_id = self.stems.get(stem(token))
+        if stem_id is not None:
+            return [(self.words[stem_id], 0)]
+        if len(token) < self.MIN_CORRECTION_LENGTH:
+            return []
+
+        candidates = set()
+        for variant in self.delete_variants(token):
+            candidates.update(self.deletes.get(variant, ()))
+
+        results = []
+        for word_id in sorted(candidates):
+            word = self.words[word_id]
+            distance = bounded_edit_distance(token, word, self.max_distance)
+            if distance is not None:
+                results.append((word, distance))
+
+        # عند التساوي تفوز الكلمة الأسبق إضافة
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def correct(self, text, is_known):
+        """استبدال كل كلمة غير معروفة في النص بأقرب كلمة من المفردات
+
+        is_known(البداية، النهاية، الكلمة) تحدد الكلمات التي لا تحتاج تصحيحاً.
+        يرجع (النص المصحح، [Correction]).
+        """
+        parts = []
+        corrections = []
+        position = 0
+        shift = 0
+
+        for match in _TOKEN_PATTERN.finditer(text):
+            token = match.group()
+            start, end = match.span()
+            if is_known(start, end, token):
+                continue
+
+            results = self.lookup(token)
+            if not results or results[0][0] == token:
+                continue
+
+            word = results[0][0]
+            parts.append(text[position:start])
+            parts.append(word)
+            position = end
+            corrections.append(Correction(start, end, start + shift, start + shift + len(word), word))
+            shift += len(word) - len(token)
+
+        if not corrections:
+            return text, corrections
+
+        parts.append(text[position:])
+        return "".join(parts), corrections
+
+
+def original_span(corrections, start, end):
+    """تحويل موضع في النص المصحح إلى الموضع المقابل في النص الأصلي"""
+
+    def map_position(position, use_end):
+        shift = 0
+        for correction in corrections:
+            if position <= correction.start:
+                break
+            if position < correction.end:
+                return correction.original_end if use_end else correction.original_start
+            shift += (correction.end - correction.start) - (correction.original_end - correction.original_start)
+        return position - shift
+
+    return map_position(start, False), map_position(end, True)
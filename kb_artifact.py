@@ -0,0 +1,283 @@
+"""تجميع قاعدة المعرفة وفهارسها في ملف ثنائي واحد يُحمّل عبر mmap
+
+بنية الملف:
+    MAGIC | رقم الإصدار وطول الرأس (<II) | رأس JSON | أقسام ثنائية بمحاذاة 8 بايت
+
+الأقسام:
+    objects          : pickle لجداول قاعدة المعرفة وفهرس البحث الاحتياطي ومفردات BM25 وملفات الأدلة
+    passage_sources  : رقم ملف الدليل لكل مقطع (H)
+    passage_starts   : بداية كل مقطع في ملفه بالبايت (Q)
+    passage_ends     : نهاية كل مقطع في ملفه بالبايت (Q)
+    passage_checksums: بصمة CRC32 لنص كل مقطع (I)
+    posting_ids      : أرقام المقاطع لكل قوائم BM25 متتالية (I)
+    posting_weights  : أوزان BM25 المقابلة (d)
+
+نصوص المقاطع لا تُخزن في الملف وتُقرأ من ملفات الأدلة عند العرض.
+الملف ذاكرة تخزين محلية موثوقة تُبنى من المصادر، وليس صيغة لتبادل البيانات.
+الرأس يحمل بصمة كود الوحدات التي تبني الفهارس، فتعديل التطبيع أو التجذيع
+أو التقسيم يعيد البناء دون تغيير رقم الإصدار يدوياً.
+"""
+import functools
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from passage_index import PassageIndex
+
+MAGIC = b"LDKBIDX\0"
+FORMAT_VERSION = 8
+
+_PREAMBLE = struct.Struct("<II")
+_ALIGNMENT = 8
+
+# الوحدات التي يحدد كودها شكل الفهارس المحفوظة
+INDEX_MODULES = (
+    "arabic_normlizer", "arabic_stemmer", "knowledge_loader", "knowledge_base",
+    "passage_index", "fallback_index", "tfidf_index", "fuzzy_index",
+)
+
+# أخطاء قراءة ملف تالف أو مقطوع أو مبني بكود مختلف
+_LOAD_ERRORS = (
+    pickle.UnpicklingError, EOFError, ValueError, TypeError, KeyError,
+    AttributeError, ImportError, IndexError, OverflowError, MemoryError, struct.error,
+)
+
+
+def source_fingerprint(path):
+    """بصمة ملف مصدر: الحجم ووقت التعديل وقيمة SHA-256"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {"size": -1, "mtime_ns": 0, "sha256": None}
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint():
+    """SHA-256 لكود وحدات INDEX_MODULES (يُحسب مرة لكل عملية)"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in INDEX_MODULES:
+        digest.update(name.encode("utf-8") + b"\0")
+        with open(os.path.join(directory, name + ".py"), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def sources_unchanged(recorded, source_paths):
+    """التحقق من أن المصادر لم تتغير منذ بناء الملف
+
+    إذا تطابق الحجم ووقت التعديل لا يُعاد حساب البصمة، وإلا يُقارن SHA-256.
+    """
+    if len(recorded) != len(source_paths):
+        return False
+
+    for fingerprint, path in zip(recorded, source_paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if fingerprint["size"] != -1:
+                return False
+            continue
+
+        if stat.st_size == fingerprint["size"] and stat.st_mtime_ns == fingerprint["mtime_ns"]:
+            continue
+        if source_fingerprint(path)["sha256"] != fingerprint["sha256"]:
+            return False
+
+    return True
+
+
+class MappedPostings(Mapping):
+    """قوائم BM25 كشرائح من المصفوفات المعينة في الذاكرة دون نسخها"""
+
+    def __init__(self, vocabulary, ids_view, weights_view):
+        self.vocabulary = vocabulary
+        self.ids_view = ids_view
+        self.weights_view = weights_view
+
+    def __getitem__(self, token):
+        start, count = self.vocabulary[token]
+        return self.ids_view[start:start + count], self.weights_view[start:start + count]
+
+    def __iter__(self):
+        return iter(self.vocabulary)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+
+def _pack_sections(knowledge_base):
+    """تحويل قاعدة المعرفة وفهارسها إلى أقسام ثنائية"""
+    passage_index = knowledge_base.passage_index
+
+    vocabulary = {}
+    posting_ids = array("I")
+    posting_weights = array("d")
+    for token, (ids, weights) in passage_index.postings.items():
+        vocabulary[token] = (len(posting_ids), len(ids))
+        posting_ids.extend(ids)
+        posting_weights.extend(weights)
+
+    objects = {
+        "knowledge": knowledge_base.knowledge,
+        "fallback_index": knowledge_base.fallback_index,
+        "vocabulary": vocabulary,
+        "bm25": {"k1": passage_index.k1, "b": passage_index.b},
+        "passage_files": passage_index.sources,
+    }
+
+    return {
+        "objects": pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL),
+        "passage_sources": array("H", passage_index.passage_sources).tobytes(),
+        "passage_starts": array("Q", passage_index.passage_starts).tobytes(),
+        "passage_ends": array("Q", passage_index.passage_ends).tobytes(),
+        "passage_checksums": array("I", passage_index.passage_checksums).tobytes(),
+        "posting_ids": posting_ids.tobytes(),
+        "posting_weights": posting_weights.tobytes(),
+    }
+
+
+def write_artifact(path, knowledge_base, source_paths):
+    """كتابة الملف المجمع بشكل ذري (ملف مؤقت ثم استبدال)"""
+    sections = _pack_sections(knowledge_base)
+
+    header = {
+        "byteorder": sys.byteorder,
+        "code": code_fingerprint(),
+        "sources": [source_fingerprint(source) for source in source_paths],
+        "sections": {},
+    }
+
+    # حساب المواضع يحتاج طول الرأس، والرأس يحتوي المواضع؛ نكرر حتى يستقر الطول
+    header_bytes = b""
+    while True:
+        offset = len(MAGIC) + _PREAMBLE.size + len(header_bytes)
+        layout = {}
+        for name, data in sections.items():
+            offset += -offset % _ALIGNMENT
+            layout[name] = [offset, len(data)]
+            offset += len(data)
+        header["sections"] = layout
+        encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+        stable = len(encoded) == len(header_bytes)
+        header_bytes = encoded
+        if stable:
+            break
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(_PREAMBLE.pack(FORMAT_VERSION, len(header_bytes)))
+        file.write(header_bytes)
+        for name, data in sections.items():
+            file.write(b"\0" * (layout[name][0] - file.tell()))
+            file.write(data)
+    os.replace(temp_path, path)
+
+
+def read_header(mapped):
+    """قراءة رأس الملف أو None إذا لم يكن بالصيغة أو الإصدار أو الكود المتوقع"""
+    preamble_end = len(MAGIC) + _PREAMBLE.size
+    if len(mapped) < preamble_end or mapped[:len(MAGIC)] != MAGIC:
+        return None
+
+    version, header_length = _PREAMBLE.unpack(mapped[len(MAGIC):preamble_end])
+    if version != FORMAT_VERSION:
+        return None
+
+    header = json.loads(bytes(mapped[preamble_end:preamble_end + header_length]).decode("utf-8"))
+    if header.get("byteorder") != sys.byteorder or header.get("code") != code_fingerprint():
+        return None
+    return header
+
+
+def load_artifact(path, source_paths, normalizer):
+    """تحميل الملف المجمع عبر mmap
+
+    يرجع (جداول قاعدة المعرفة، فهرس البحث الاحتياطي، فهرس المقاطع) أو None
+    إذا كان الملف غير موجود أو بإصدار مختلف أو مبنياً من مصادر أو كود تغير
+    أو تالفاً، فيُعاد بناؤه من المصادر.
+    """
+    try:
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        header = read_header(mapped)
+        valid = header is not None and sources_unchanged(header["sources"], source_paths)
+        loaded = _unpack_sections(mapped, header, normalizer) if valid else None
+    except _LOAD_ERRORS:
+        loaded = None
+
+    if loaded is None:
+        # بعد تحرير إطار الاستثناء حتى لا تبقى شرائح معلقة بالملف
+        mapped.close()
+    return loaded
+
+
+def _unpack_sections(mapped, header, normalizer):
+    """بناء الجداول والفهارس من أقسام الملف المعين في الذاكرة"""
+    view = memoryview(mapped)
+
+    def section(name):
+        start, length = header["sections"][name]
+        if start < 0 or start + length > len(view):
+            raise ValueError(f"القسم {name} خارج حدود الملف")
+        return view[start:start + length]
+
+    objects = pickle.loads(section("objects"))
+
+    passage_index = PassageIndex(normalizer, **objects["bm25"])
+    passage_index.sources = objects["passage_files"]
+    passage_index.passage_sources = section("passage_sources").cast("H")
+    passage_index.passage_starts = section("passage_starts").cast("Q")
+    passage_index.passage_ends = section("passage_ends").cast("Q")
+    passage_index.passage_checksums = section("passage_checksums").cast("I")
+    passage_count = len(passage_index.passage_sources)
+    if not passage_count == len(passage_index.passage_starts) == len(passage_index.passage_ends) \
+            == len(passage_index.passage_checksums):
+        raise ValueError("أطوال أقسام المقاطع غير متطابقة")
+    passage_index.postings = MappedPostings(
+        objects["vocabulary"],
+        section("posting_ids").cast("I"),
+        section("posting_weights").cast("d"),
+    )
+
+    return objects["knowledge"], objects["fallback_index"], passage_index
+
+
+def main(argv=None):
+    """خطوة البناء: python kb_artifact.py <ملف الدليل> [ملف الفهرس]"""
+    from knowledge_base import SpecializedKnowledgeBase, default_index_path
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("الاستخدام: python kb_artifact.py <ملف الدليل> [ملف الفهرس]")
+        return 2
+
+    file_path = argv[0]
+    index_path = argv[1] if len(argv) > 1 else default_index_path(file_path)
+
+    knowledge_base = SpecializedKnowledgeBase(file_path)
+    write_artifact(index_path, knowledge_base.snapshot, knowledge_base.source_paths())
+    print(f"✅ تم بناء فهرس قاعدة المعرفة: {index_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
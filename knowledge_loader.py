@@ -0,0 +1,244 @@
+"""تحميل قاعدة المعرفة من ملف JSON والتحقق منها وتجميعها في جداول بأرقام صحيحة
+
+بنية الملف (knowledge_base.json):
+    format_version  : رقم إصدار الصيغة
+    topics          : الموضوع -> {intents: النية -> {keywords, response, suggestions?}, prompts?}
+    intents         : النية -> {heading, prompts} (اقتراحات الرد الافتراضي حسب النية)
+    general_prompts : [{heading, prompts}] (اقتراحات الرد الافتراضي العامة)
+"""
+import json
+import sys
+from array import array
+
+FORMAT_VERSION = 1
+
+# الفاصل المستخدم في معرفات الردود، فلا يجوز في أسماء المواضيع والنيات
+_RESERVED_SEPARATOR = ":"
+
+_TEXT = {"type": str, "non_empty": True}
+_TEXT_LIST = {"type": list, "items": _TEXT, "min_items": 1}
+_PROMPT_GROUP = {
+    "type": dict,
+    "required": {"heading": _TEXT, "prompts": _TEXT_LIST},
+}
+_ENTRY = {
+    "type": dict,
+    "required": {"keywords": _TEXT_LIST, "response": _TEXT},
+    "optional": {"suggestions": _TEXT_LIST},
+}
+_TOPIC = {
+    "type": dict,
+    "required": {"intents": {"type": dict, "values": _ENTRY, "min_items": 1}},
+    "optional": {"prompts": _TEXT_LIST},
+}
+SCHEMA = {
+    "type": dict,
+    "required": {
+        "format_version": {"type": int},
+        "topics": {"type": dict, "values": _TOPIC, "min_items": 1},
+    },
+    "optional": {
+        "intents": {"type": dict, "values": _PROMPT_GROUP},
+        "general_prompts": {"type": list, "items": _PROMPT_GROUP},
+    },
+}
+
+
+class KnowledgeDataError(ValueError):
+    """بيانات قاعدة المعرفة غير مطابقة للمخطط"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("بيانات قاعدة المعرفة غير صالحة:\n" + "\n".join(errors))
+
+
+def validate_value(value, schema, path, errors):
+    """مطابقة قيمة مع جزء من المخطط وإضافة الأخطاء بمسارها"""
+    expected = schema["type"]
+    # bool نوع فرعي من int في Python
+    if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+        errors.append(f"{path}: النوع المتوقع {expected.__name__}")
+        return
+
+    if schema.get("non_empty") and not value.strip():
+        errors.append(f"{path}: نص فارغ")
+
+    if "min_items" in schema and len(value) < schema["min_items"]:
+        errors.append(f"{path}: يجب ألا يقل عدد العناصر عن {schema['min_items']}")
+
+    if "items" in schema:
+        for position, item in enumerate(value):
+            validate_value(item, schema["items"], f"{path}[{position}]", errors)
+
+    if "values" in schema:
+        for key, item in value.items():
+            if not key.strip() or _RESERVED_SEPARATOR in key:
+                errors.append(f"{path}: اسم غير صالح {key!r}")
+            validate_value(item, schema["values"], f"{path}.{key}", errors)
+
+    if "required" in schema:
+        fields = {**schema["required"], **schema.get("optional", {})}
+        for key in schema["required"]:
+            if key not in value:
+                errors.append(f"{path}.{key}: حقل مطلوب")
+        for key, item in value.items():
+            if key not in fields:
+                errors.append(f"{path}.{key}: حقل غير معروف")
+            else:
+                validate_value(item, fields[key], f"{path}.{key}", errors)
+
+
+def validate_knowledge_data(data):
+    """قائمة أخطاء مطابقة البيانات مع المخطط (فارغة إذا كانت صالحة)"""
+    errors = []
+    validate_value(data, SCHEMA, "$", errors)
+    if not errors and data["format_version"] != FORMAT_VERSION:
+        errors.append(f"$.format_version: الإصدار المدعوم {FORMAT_VERSION}")
+    return errors
+
+
+def _intern_all(strings):
+    return tuple(sys.intern(string) for string in strings)
+
+
+class CompiledKnowledge:
+    """جداول قاعدة المعرفة بعد التحقق منها
+
+    المواضيع والنيات والمدخلات مرقمة بأرقام صحيحة، وجداول كل نوع
+    قوائم مفهرسة بهذه الأرقام. الأسماء والكلمات المفتاحية والاقتراحات
+    مخزنة كنصوص مشتركة (interned) فالنص المكرر لا يُخزن إلا مرة.
+    """
+
+    def __init__(self, data):
+        # رقم الموضوع/النية -> الاسم، والعكس
+        self.topic_names = []
+        self.topic_ids = {}
+        self.intent_names = []
+        self.intent_ids = {}
+
+        # (رقم الموضوع، رقم النية) -> رقم المدخل، وجداول المدخلات بأرقامها
+        self.entry_ids = {}
+        self.entry_topics = array('H')
+        self.entry_intents = array('H')
+        self.responses = []
+        self.keywords = []
+        self.suggestions = []
+
+        # اقتراحات الرد الافتراضي
+        self.topic_prompts = []
+        self.intent_prompts = {}
+        self.general_prompts = ()
+
+        self.compile(data)
+        # نفس البيانات بالشكل المتداخل القديم للفهارس والكود المعتمد عليه
+        self.knowledge_dict = self.build_knowledge_dict()
+
+    def compile(self, data):
+        """تحويل البيانات المتحقق منها إلى الجداول"""
+        for topic, topic_data in data["topics"].items():
+            topic_id = self.add_name(topic, self.topic_names, self.topic_ids)
+            self.topic_prompts.append(_intern_all(topic_data.get("prompts", ())))
+
+            for intent, entry in topic_data["intents"].items():
+                intent_id = self.add_name(intent, self.intent_names, self.intent_ids)
+                self.entry_ids[(topic_id, intent_id)] = len(self.responses)
+                self.entry_topics.append(topic_id)
+                self.entry_intents.append(intent_id)
+                self.responses.append(entry["response"])
+                self.keywords.append(_intern_all(entry["keywords"]))
+                self.suggestions.append(_intern_all(entry.get("suggestions", ())))
+
+        for intent, group in data.get("intents", {}).items():
+            intent_id = self.add_name(intent, self.intent_names, self.intent_ids)
+            self.intent_prompts[intent_id] = (sys.intern(group["heading"]), _intern_all(group["prompts"]))
+
+        self.general_prompts = tuple(
+            (sys.intern(group["heading"]), _intern_all(group["prompts"]))
+            for group in data.get("general_prompts", ())
+        )
+
+    @staticmethod
+    def add_name(name, names, ids):
+        """رقم الاسم في الجدول مع إضافته إذا كان جديداً"""
+        name = sys.intern(name)
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def build_knowledge_dict(self):
+        """{الموضوع: {النية: {keywords, response}}} بنفس ترتيب الملف"""
+        knowledge = {}
+        for entry_id, response in enumerate(self.responses):
+            topic = self.topic_names[self.entry_topics[entry_id]]
+            intent = self.intent_names[self.entry_intents[entry_id]]
+            knowledge.setdefault(topic, {})[intent] = {
+                "keywords": list(self.keywords[entry_id]),
+                "response": response,
+            }
+        return knowledge
+
+    def entry_id(self, topic, intent):
+        """رقم المدخل للموضوع والنية أو None"""
+        topic_id = self.topic_ids.get(topic)
+        intent_id = self.intent_ids.get(intent)
+        if topic_id is None or intent_id is None:
+            return None
+        return self.entry_ids.get((topic_id, intent_id))
+
+    def get_response(self, topic, intent):
+        """نص الرد للموضوع والنية أو None"""
+        entry_id = self.entry_id(topic, intent)
+        return None if entry_id is None else self.responses[entry_id]
+
+    def get_suggestions(self, topic, intent):
+        """الاقتراحات الإضافية بعد الرد المتخصص"""
+        entry_id = self.entry_id(topic, intent)
+        return () if entry_id is None else self.suggestions[entry_id]
+
+    def get_topic_prompts(self, topic):
+        """أسئلة مقترحة في الرد الافتراضي عند معرفة الموضوع"""
+        topic_id = self.topic_ids.get(topic)
+        return () if topic_id is None else self.topic_prompts[topic_id]
+
+    def get_intent_prompts(self, intent):
+        """(العنوان، الأسئلة المقترحة) عند معرفة النية أو None"""
+        intent_id = self.intent_ids.get(intent)
+        return self.intent_prompts.get(intent_id)
+
+
+def compile_knowledge(data):
+    """التحقق من البيانات وتجميعها، مع KnowledgeDataError عند وجود أخطاء"""
+    errors = validate_knowledge_data(data)
+    if errors:
+        raise KnowledgeDataError(errors)
+    return CompiledKnowledge(data)
+
+
+def load_knowledge(path):
+    """قراءة ملف قاعدة المعرفة وتجميعه"""
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            data = json.load(file)
+        except json.JSONDecodeError as e:
+            raise KnowledgeDataError([f"{path}: JSON غير صالح ({e})"]) from e
+    return compile_knowledge(data)
+
+
+def main(argv=None):
+    """التحقق من ملف قاعدة المعرفة: python knowledge_loader.py [الملف]"""
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else "knowledge_base.json"
+
+    try:
+        knowledge = load_knowledge(path)
+    except KnowledgeDataError as e:
+        print(e)
+        return 1
+
+    print(f"✅ {path}: {len(knowledge.topic_names)} مواضيع، {len(knowledge.responses)} ردود")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
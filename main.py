@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from profiling import DEFAULT_PROFILE_DIR, PROFILE_MODES, RequestProfiler
+from conversation_history import ConversationHistory
+from knowledge_base import SpecializedKnowledgeBase, default_index_path
+from respond_handler import AdvancedResponseHandler
+from shared_resources import get_shared_resources
+
+logger = logging.getLogger(__name__)
+
+# معالج الأسئلة الخاص بكل عملية عاملة (يُبنى مرة واحدة في التهيئة)
+_worker_handler = None
+
+
+def build_handler(file_path, index_path, profiler=None):
+    """بناء معالج يعتمد على الموارد المشتركة للعملية الحالية"""
+    resources = get_shared_resources(file_path, index_path=index_path)
+    return AdvancedResponseHandler(
+        resources.knowledge_base,
+        intent_analyzer=resources.intent_analyzer,
+        # الوضع الجماعي لا يحتاج تاريخ محادثة
+        history=ConversationHistory(max_records=0),
+        response_cache=resources.response_cache,
+        profiler=profiler,
+    )
+
+
+def build_profiler(args):
+    """أداة تسجيل الأداء إذا طُلبت نسبة عينة أو سُمح بالطلب لكل سؤال، وإلا None"""
+    if args.profile_rate <= 0 and not args.allow_profile:
+        return None
+    return RequestProfiler(args.profile_dir, args.profile_rate, args.profile_mode)
+
+
+def init_worker(file_path, index_path, log_level=logging.WARNING, profiler=None):
+    """تهيئة العملية العاملة: تحميل قاعدة المعرفة مرة واحدة"""
+    global _worker_handler
+    # السجلات تذهب إلى stderr، فـ stdout يبقى لقناة النتائج
+    metrics.configure_logging(log_level)
+    _worker_handler = build_handler(file_path, index_path, profiler)
+
+
+def answer_chunk(items, include_text=False, handler=None):
+    """الإجابة عن مجموعة أسئلة وإرجاع سجل JSON لكل سؤال"""
+    handler = handler or _worker_handler
+    if handler.profiler is not None:
+        # كل ملف أداء يغطي سؤالاً واحداً بمساره الكامل (التطبيع والتحليل والبحث)
+        responses = [handler.respond(question, profile) for _, question, profile in items]
+    else:
+        responses = handler.process_batch([question for _, question, _ in items], max_workers=1)
+
+    records = []
+    for (item_id, question, _), response in zip(items, responses):
+        record = {
+            "id": item_id,
+            "question": question,
+            "intent": response.analysis.intent,
+            "topic": response.analysis.topic,
+            "confidence": round(response.analysis.confidence, 4),
+            "tier": response.tier,
+            "response_id": response.response_id,
+        }
+        if include_text:
+            record["response"] = response.text
+        records.append(record)
+    return records
+
+
+def answer_chunk_with_metrics(items, include_text=False):
+    """الإجابة في عملية عاملة مع مقاييسها منذ آخر مجموعة لتُدمج في العملية الرئيسية"""
+    records = answer_chunk(items, include_text)
+    return records, metrics.registry.drain()
+
+
+def read_questions(stream):
+    """قراءة الأسئلة سطراً سطراً: نص عادي أو JSON به question (و id و profile اختيارياً)
+
+    يرجع (المعرف، السؤال، طلب ملف أداء). سطر JSON غير صالح أو بلا question نصي يُسجل برقمه ويُتخطى دون إيقاف التشغيل.
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                logger.warning("تخطي السطر %d: JSON غير صالح (%s)", line_number, e)
+                continue
+            question = item.get("question") if isinstance(item, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                logger.warning("تخطي السطر %d: لا يوجد حقل question نصي", line_number)
+                continue
+            yield item.get("id", line_number), question, bool(item.get("profile"))
+        else:
+            yield line_number, line, False
+
+
+def iter_chunks(items, chunk_size):
+    """تقسيم مولد الأسئلة إلى مجموعات دون قراءته كاملاً"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def answer_stream(questions, args):
+    """توليد السجلات بنفس ترتيب المدخلات"""
+    chunks = iter_chunks(questions, args.chunk_size)
+
+    if args.workers <= 1:
+        handler = build_handler(args.kb, args.index, build_profiler(args))
+        for chunk in chunks:
+            yield from answer_chunk(chunk, args.include_text, handler)
+        return
+
+    # بناء الفهرس مرة واحدة قبل تشغيل العمليات حتى تحمله كلها عبر mmap
+    SpecializedKnowledgeBase(args.kb, index_path=args.index)
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=init_worker,
+        initargs=(args.kb, args.index, args.log_level, build_profiler(args)),
+    ) as executor:
+        # عدد محدود من المجموعات قيد التنفيذ حتى لا تُقرأ المدخلات كلها في الذاكرة
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(answer_chunk_with_metrics, chunk, args.include_text))
+            if len(pending) >= args.workers * 2:
+                yield from collect_chunk(pending.popleft())
+        while pending:
+            yield from collect_chunk(pending.popleft())
+
+
+def collect_chunk(future):
+    """سجلات مجموعة من عملية عاملة بعد دمج مقاييسها في سجل العملية الرئيسية"""
+    records, worker_metrics = future.result()
+    metrics.registry.merge(worker_metrics)
+    return records
+
+
+def write_metrics(path):
+    """كتابة المقاييس: صيغة Prometheus النصية لملفات .prom، و JSON لغيرها"""
+    with open(path, "w", encoding="utf-8") as file:
+        if path.endswith(".prom"):
+            file.write(metrics.registry.to_prometheus())
+        else:
+            file.write(metrics.registry.to_json())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="الإجابة عن أسئلة من stdin أو ملف JSONL وكتابة النتائج بصيغة JSONL"
+    )
+    parser.add_argument("--input", "-i", help="ملف الأسئلة (الافتراضي: stdin)")
+    parser.add_argument("--output", "-o", help="ملف النتائج (الافتراضي: stdout)")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1,
+                        help="عدد العمليات العاملة (1 للتشغيل في نفس العملية)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="عدد الأسئلة في كل مجموعة")
+    parser.add_argument("--kb", default="after_cleaning.txt", help="ملف الدليل التربوي")
+    parser.add_argument("--index", help="ملف الفهرس المجمع (الافتراضي بجوار ملف الدليل)")
+    parser.add_argument("--include-text", action="store_true", help="إضافة نص الرد لكل سجل")
+    parser.add_argument("--log-level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="مستوى السجلات على stderr")
+    parser.add_argument("--metrics-output", help="كتابة أزمنة المراحل (.prom لصيغة Prometheus، وإلا JSON)")
+    parser.add_argument("--profile-rate", type=float, default=0.0,
+                        help="نسبة الأسئلة التي يُسجل لها ملف أداء (0 لإيقاف التسجيل، 1 لكل الأسئلة)")
+    parser.add_argument("--allow-profile", action="store_true",
+                        help='تسجيل ملف أداء لأسطر JSONL التي تحمل "profile": true حتى مع نسبة 0')
+    parser.add_argument("--profile-mode", default="cprofile", choices=PROFILE_MODES, help="نوع ملفات الأداء")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="مجلد ملفات الأداء")
+    args = parser.parse_args(argv)
+    args.log_level = getattr(logging, args.log_level)
+    args.index = args.index or default_index_path(args.kb)
+    return args
+
+
+def main(argv=None):
+    """تشغيل وضع الإجابة الجماعية من سطر الأوامر"""
+    args = parse_args(argv)
+    metrics.configure_logging(args.log_level)
+
+    input_stream = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    output_stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    try:
+        for record in answer_stream(read_questions(input_stream), args):
+            output_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if args.input:
+            input_stream.close()
+        if args.output:
+            output_stream.close()
+
+    if args.metrics_output:
+        write_metrics(args.metrics_output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
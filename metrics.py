@@ -0,0 +1,317 @@
+"""مقاييس الأداء داخل العملية وإعداد السجلات
+
+المقاييس مدرجات تكرارية (زمن كل مرحلة وكل طلب) وعدادات (المستوى الذي
+أجاب، إصابات الذاكرة المؤقتة)، وتُصدر بصيغة Prometheus النصية أو JSON.
+السجلات تمر عبر طابور إلى خيط خلفي، فلا يكتب مسار الطلب على الشاشة.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+
+# حدود المدرج بالثواني: من 10 ميكروثانية حتى ثانية
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+# وصف المقاييس التي يسجلها معالج الأسئلة
+METRIC_HELP = {
+    "chatbot_stage_seconds": "زمن كل مرحلة في مسار الإجابة",
+    "chatbot_request_seconds": "زمن الإجابة الكامل حسب المستوى الذي أجاب",
+    "chatbot_responses_total": "عدد الردود حسب المستوى الذي أجاب",
+    "chatbot_cache_lookups_total": "عمليات البحث في ذاكرة الردود المؤقتة",
+    "chatbot_http_requests_total": "طلبات HTTP حسب المسار والحالة",
+}
+
+
+class StageTimer:
+    """توقيت مراحل طلب واحد: كل علامة تسجل الزمن منذ العلامة السابقة"""
+
+    __slots__ = ("started", "last", "stages")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def resume(self):
+        """متابعة التوقيت بعد انتظار لا يُحسب (مثل طابور منفذ الخيوط)"""
+        now = time.perf_counter()
+        self.started += now - self.last
+        self.last = now
+
+    def elapsed(self):
+        return self.last - self.started
+
+
+class _NullTimer:
+    """مؤقت لا يسجل شيئاً، لاستدعاء المراحل خارج معالج الأسئلة"""
+
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Histogram:
+    """مدرج تكراري بحدود ثابتة"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # عنصر إضافي للقيم الأكبر من آخر حد (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """العدد التراكمي لكل حد بما فيه +Inf"""
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, fraction):
+        """تقدير النسبة المئوية من حدود المدرج (الحد الأعلى للفئة)"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        for bound, cumulative in zip(self.buckets, self.cumulative_counts()):
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in items) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """سجل المقاييس للعملية: مدرجات وعدادات بأسماء وتسميات (labels)
+
+    آمن للاستخدام من عدة خيوط. كل تسجيل يحجز القفل لعملية حسابية واحدة.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, help_texts=None):
+        self.buckets = tuple(buckets)
+        self.help_texts = dict(METRIC_HELP if help_texts is None else help_texts)
+        # (الاسم، التسميات مرتبة) -> Histogram أو رقم
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        """تسجيل قيمة في مدرج"""
+        with self._lock:
+            self._observe_locked(name, value, tuple(sorted(labels.items())))
+
+    def increment(self, name, amount=1, **labels):
+        """زيادة عداد"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def record_stages(self, timer, tier, cached):
+        """تسجيل مراحل طلب واحد والمستوى الذي أجاب"""
+        with self._lock:
+            for stage, seconds in timer.stages:
+                self._observe_locked("chatbot_stage_seconds", seconds, (("stage", stage),))
+            self._observe_locked("chatbot_request_seconds", timer.elapsed(), (("tier", tier),))
+            for key in (
+                ("chatbot_responses_total", (("tier", tier),)),
+                ("chatbot_cache_lookups_total", (("result", "hit" if cached else "miss"),)),
+            ):
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _observe_locked(self, name, value, labels):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def snapshot(self):
+        """نسخة خام قابلة للنقل بين العمليات (pickle) لدمجها بـ merge"""
+        with self._lock:
+            return self._raw_locked()
+
+    def drain(self):
+        """نسخة خام ثم تصفير السجل (للعمليات العاملة)"""
+        with self._lock:
+            data = self._raw_locked()
+            self.histograms.clear()
+            self.counters.clear()
+        return data
+
+    def _raw_locked(self):
+        return {
+            "histograms": [
+                (name, labels, list(histogram.counts), histogram.sum, histogram.count)
+                for (name, labels), histogram in self.histograms.items()
+            ],
+            "counters": [(name, labels, value) for (name, labels), value in self.counters.items()],
+        }
+
+    def merge(self, data):
+        """إضافة نسخة خام من سجل آخر (بنفس حدود المدرجات)"""
+        with self._lock:
+            for name, labels, counts, total, count in data["histograms"]:
+                histogram = self.histograms.get((name, labels))
+                if histogram is None:
+                    histogram = self.histograms[(name, labels)] = Histogram(self.buckets)
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+            for name, labels, value in data["counters"]:
+                self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def to_dict(self):
+        """المقاييس كقاموس قابل للكتابة كـ JSON"""
+        with self._lock:
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                    # None إذا كانت النسبة فوق آخر حد في المدرج
+                    **{
+                        key: (value if value != float("inf") else None)
+                        for key, value in (
+                            ("p50", histogram.quantile(0.50)),
+                            ("p95", histogram.quantile(0.95)),
+                            ("p99", histogram.quantile(0.99)),
+                        )
+                    },
+                    "buckets": [
+                        [_format_number(bound), cumulative]
+                        for bound, cumulative in zip((*histogram.buckets, float("inf")), histogram.cumulative_counts())
+                    ],
+                })
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {"histograms": histograms, "counters": counters}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """المقاييس بصيغة Prometheus النصية"""
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                by_name.setdefault(name, []).append((labels, histogram))
+            for name, series in by_name.items():
+                self._describe(lines, name, "histogram")
+                for labels, histogram in series:
+                    for bound, cumulative in zip((*histogram.buckets, float("inf")), histogram.cumulative_counts()):
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+            by_name = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in by_name.items():
+                self._describe(lines, name, "counter")
+                for labels, value in series:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _describe(self, lines, name, kind):
+        help_text = self.help_texts.get(name)
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+# سجل المقاييس المشترك للعملية
+registry = MetricsRegistry()
+
+_log_listener = None
+_log_handler = None
+_log_pid = None
+_log_lock = threading.Lock()
+
+
+def configure_logging(level=logging.WARNING, handler=None):
+    """توجيه سجلات البرنامج عبر طابور إلى خيط خلفي يكتبها
+
+    مسار الطلب يضع السجل في الطابور فقط، والكتابة (stderr افتراضياً)
+    تحدث في خيط المستمع. الاستدعاء المتكرر يغير المستوى فقط، والعملية
+    المتفرعة (fork) تبدأ مستمعاً خاصاً بها لأن خيط الأب لا ينتقل إليها.
+    """
+    global _log_listener, _log_handler, _log_pid
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    with _log_lock:
+        if _log_listener is not None and _log_pid == os.getpid():
+            return
+        if _log_handler is not None:
+            root.removeHandler(_log_handler)
+
+        if handler is None:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        log_queue = queue.SimpleQueue()
+        _log_handler = logging.handlers.QueueHandler(log_queue)
+        root.addHandler(_log_handler)
+        _log_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _log_pid = os.getpid()
+        _log_listener.start()
+        # العمليات العاملة في multiprocessing تنتهي دون atexit، فتُفرغ الطابور بالمُنهي
+        atexit.register(_stop_listener, _log_listener)
+        multiprocessing.util.Finalize(None, _stop_listener, args=(_log_listener,), exitpriority=10)
+
+
+def _stop_listener(listener):
+    """كتابة ما بقي في الطابور وإيقاف المستمع (مرة واحدة)"""
+    if listener._thread is not None:
+        listener.stop()
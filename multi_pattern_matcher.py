@@ -0,0 +1,84 @@
+from collections import deque
+
+
+class AhoCorasickMatcher:
+    """مطابق أنماط متعددة (Aho-Corasick) يجد كل التطابقات في مرور واحد على النص"""
+
+    def __init__(self, patterns=None):
+        # كل عقدة: انتقالات، رابط الفشل، الأنماط المنتهية عندها، وأقرب عقدة لاحقة لها مخرجات
+        self.transitions = [{}]
+        self.fail_links = [0]
+        self.outputs = [[]]
+        self.output_links = [None]
+        self.is_built = False
+
+        if patterns:
+            for phrase, payload in patterns:
+                self.add(phrase, payload)
+            self.build()
+
+    def add(self, phrase, payload):
+        """إضافة عبارة إلى المطابق مع البيانات المرتبطة بها"""
+        if not phrase:
+            return
+
+        node = 0
+        for char in phrase:
+            next_node = self.transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self.transitions)
+                self.transitions.append({})
+                self.fail_links.append(0)
+                self.outputs.append([])
+                self.output_links.append(None)
+                self.transitions[node][char] = next_node
+            node = next_node
+
+        self.outputs[node].append((len(phrase), payload))
+        self.is_built = False
+
+    def build(self):
+        """حساب روابط الفشل بالمرور العرضي على الشجرة"""
+        queue = deque()
+        for child in self.transitions[0].values():
+            self.fail_links[child] = 0
+            self.output_links[child] = None
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self.transitions[node].items():
+                fallback = self.fail_links[node]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail_links[fallback]
+                fail_node = self.transitions[fallback].get(char, 0)
+                self.fail_links[child] = fail_node
+                self.output_links[child] = (
+                    fail_node if self.outputs[fail_node] else self.output_links[fail_node]
+                )
+                queue.append(child)
+
+        self.is_built = True
+
+    def iter_matches(self, text):
+        """إرجاع كل التطابقات بالشكل (البداية، النهاية، البيانات) بترتيب نهاياتها"""
+        if not self.is_built:
+            self.build()
+
+        transitions = self.transitions
+        fail_links = self.fail_links
+        outputs = self.outputs
+        output_links = self.output_links
+
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in transitions[node]:
+                node = fail_links[node]
+            node = transitions[node].get(char, 0)
+
+            match_node = node if outputs[node] else output_links[node]
+            while match_node is not None:
+                end = position + 1
+                for length, payload in outputs[match_node]:
+                    yield end - length, end, payload
+                match_node = output_links[match_node]
@@ -0,0 +1,215 @@
+import heapq
+import logging
+import math
+import os
+import re
+import zlib
+from array import array
+from collections import deque
+
+from arabic_stemmer import GENERIC_STEMS, stem
+
+logger = logging.getLogger(__name__)
+
+# كلمات شائعة لا تميز مقطعاً عن آخر (بعد التطبيع)
+STOP_WORDS = frozenset([
+    "في", "من", "علي", "على", "الي", "الى", "عن", "مع", "ان", "او", "و", "ثم",
+    "هو", "هي", "هم", "هما", "دا", "دي", "ده", "اللي", "التي", "الذي", "هذا", "هذه",
+    "ما", "ماذا", "هل", "كيف", "ازاي", "ايه", "ليه", "يعني", "انا", "عند", "عنده",
+    "لا", "مش", "كل", "بين", "لدي", "لديه", "يكون", "بيكون", "كان", "طيب",
+    # كلام الأهل بالعامية: الإشارة للطفل وحشو السؤال (يرد في معظم الأسئلة
+    # ويطابق مقاطع قوائم الأسئلة في الدليل بدل موضوع السؤال)
+    "ابني", "ابنتي", "بنتي", "ولدي", "طفلي", "ابنه", "ابنها", "بنته", "عندي", "عندها",
+    "ومش", "وهو", "وهي", "بيعرف", "بتعرف", "ممكن", "عايز", "عاوز", "عايزه", "اعمل",
+    "اعرف", "كتير", "خالص", "اوي", "جدا", "شكرا", "لو", "حاجه", "طول", "بس",
+])
+
+_TOKEN_PATTERN = re.compile(r'[^\W\d_]{2,}')
+
+# حجم الجزء المقروء من ملف الدليل في كل مرة
+READ_CHUNK_SIZE = 1 << 20
+
+
+def tokenize(normalized_text):
+    """تقسيم النص المطبع إلى جذوع الكلمات المفهرسة مع حذف الكلمات الشائعة والعامة والأرقام"""
+    stems = (stem(token) for token in _TOKEN_PATTERN.findall(normalized_text) if token not in STOP_WORDS)
+    return [token_stem for token_stem in stems if token_stem not in GENERIC_STEMS]
+
+
+def iter_source_lines(path, chunk_size=READ_CHUNK_SIZE):
+    """قراءة الملف على أجزاء وإرجاع (بداية السطر، نهايته بالبايت، نصه)"""
+    with open(path, 'rb') as file:
+        position = 0
+        pending = b""
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            pending += chunk
+            lines = pending.split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                end = position + len(line) + 1
+                yield position, end, line.decode('utf-8', errors='replace')
+                position = end
+        if pending:
+            yield position, position + len(pending), pending.decode('utf-8', errors='replace')
+
+
+def stream_passages(path, lines_per_passage=6, overlap=2, chunk_size=READ_CHUNK_SIZE):
+    """تقسيم الدليل إلى مقاطع متداخلة من الأسطر غير الفارغة أثناء القراءة
+
+    يرجع (بداية المقطع، نهايته بالبايت، نصه) دون الاحتفاظ بالملف كاملاً،
+    فلا يبقى في الذاكرة إلا أسطر المقطع الحالي.
+    """
+    step = max(lines_per_passage - overlap, 1)
+    window = deque()
+    emitted = False
+
+    for start, end, line in iter_source_lines(path, chunk_size):
+        line = line.strip()
+        if not line:
+            continue
+        window.append((start, end, line))
+
+        if len(window) == lines_per_passage:
+            yield window[0][0], window[-1][1], "\n".join(text for _, _, text in window)
+            emitted = True
+            for _ in range(min(step, len(window))):
+                window.popleft()
+
+    # أسطر أخيرة لم يشملها أي مقطع سابق
+    if window and (not emitted or len(window) > overlap):
+        yield window[0][0], window[-1][1], "\n".join(text for _, _, text in window)
+
+
+def passage_checksum(text):
+    """بصمة نص المقطع لاكتشاف تغير الدليل بعد بناء الفهرس"""
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def read_passage(path, start, end):
+    """قراءة نص مقطع من الملف بمواضعه بالبايت"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    lines = data.decode('utf-8', errors='replace').split("\n")
+    return "\n".join(line.strip() for line in lines if line.strip())
+
+
+class PassageIndex:
+    """فهرس BM25 لمقاطع الدليل التربوي
+
+    أوزان BM25 لكل (كلمة، مقطع) محسوبة مسبقاً ومخزنة في مصفوفات متفرقة،
+    فيكفي عند الاستعلام جمع أوزان قوائم كلمات السؤال فقط. نصوص المقاطع
+    لا تُخزن؛ يُحفظ موضع كل مقطع في ملفه ويُقرأ عند عرضه فقط، مع بصمة
+    نصه للتأكد أن الملف لم يتغير منذ البناء.
+    """
+
+    def __init__(self, normalizer, k1=1.5, b=0.75):
+        self.normalizer = normalizer
+        self.k1 = k1
+        self.b = b
+        # ملفات الأدلة، ولكل مقطع: رقم ملفه وبدايته ونهايته بالبايت
+        self.sources = []
+        self.passage_sources = array('H')
+        self.passage_starts = array('Q')
+        self.passage_ends = array('Q')
+        self.passage_checksums = array('I')
+        # الكلمة -> (أرقام المقاطع، أوزان BM25)
+        self.postings = {}
+
+    @classmethod
+    def from_files(cls, paths, normalizer, **params):
+        """بناء الفهرس من ملفات الأدلة بالقراءة المتدفقة"""
+        index = cls(normalizer, **params)
+        index.build(index.iter_passages(paths))
+        return index
+
+    def iter_passages(self, paths):
+        """مقاطع كل الأدلة بالشكل (رقم الملف، البداية، النهاية، النص)"""
+        for path in paths:
+            source_id = len(self.sources)
+            self.sources.append(os.path.abspath(path))
+            try:
+                for start, end, text in stream_passages(path):
+                    yield source_id, start, end, text
+            except FileNotFoundError:
+                logger.warning("الملف %s غير موجود", path)
+
+    def build(self, passages):
+        """حساب أوزان BM25 لكل المقاطع"""
+        # الكلمة -> (أرقام المقاطع، تكرار الكلمة في كل مقطع)
+        raw_postings = {}
+        lengths = array('I')
+
+        for source_id, start, end, passage in passages:
+            tokens = tokenize(self.normalizer.normalize(passage))
+            if not tokens:
+                continue
+
+            passage_id = len(lengths)
+            self.passage_sources.append(source_id)
+            self.passage_starts.append(start)
+            self.passage_ends.append(end)
+            self.passage_checksums.append(passage_checksum(passage))
+            lengths.append(len(tokens))
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, frequency in counts.items():
+                posting = raw_postings.get(token)
+                if posting is None:
+                    posting = raw_postings[token] = (array('I'), array('I'))
+                posting[0].append(passage_id)
+                posting[1].append(frequency)
+
+        if not lengths:
+            return
+
+        passage_count = len(lengths)
+        average_length = sum(lengths) / passage_count
+
+        for token, (passage_ids, frequencies) in raw_postings.items():
+            document_frequency = len(passage_ids)
+            idf = math.log(1 + (passage_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+            weights = array('d')
+            for passage_id, frequency in zip(passage_ids, frequencies):
+                length_norm = self.k1 * (1 - self.b + self.b * lengths[passage_id] / average_length)
+                weights.append(idf * frequency * (self.k1 + 1) / (frequency + length_norm))
+            self.postings[token] = (passage_ids, weights)
+
+    def search(self, normalized_query, top_k=3):
+        """إرجاع أفضل المقاطع [(رقم المقطع، النقاط)] من الأعلى للأقل"""
+        scores = {}
+        for token in dict.fromkeys(tokenize(normalized_query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            for passage_id, weight in zip(*posting):
+                scores[passage_id] = scores.get(passage_id, 0.0) + weight
+
+        # عند التعادل يفوز المقطع الأسبق في الدليل
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def __len__(self):
+        return len(self.passage_starts)
+
+    def get_passage(self, passage_id):
+        """نص المقطع برقمه (يُقرأ من ملف الدليل)
+        
+        يرجع None إذا لم يعد المقطع موجوداً أو تغير الملف منذ بناء الفهرس،
+        فلا يُعرض نص آخر من نفس المواضع.
+        """
+        if not 0 <= passage_id < len(self.passage_starts):
+            return None
+        try:
+            passage = read_passage(
+                self.sources[self.passage_sources[passage_id]],
+                self.passage_starts[passage_id],
+                self.passage_ends[passage_id],
+            )
+        except OSError:
+            return None
+        if passage_checksum(passage) != self.passage_checksums[passage_id]:
+            return None
+        return passage
@@ -0,0 +1,246 @@
+"""تسجيل ملفات أداء لطلبات مختارة من مسار الإجابة
+
+الوضع اختياري: المعالج بدون profiler لا يدفع أي تكلفة، ومعه يُسجل ملف
+لكل طلب مطلوب صراحة أو لنسبة عشوائية من الطلبات. الملفات قابلة للتجميع:
+- cprofile: ملف pstats (.prof) يُجمع بـ pstats.Stats أو بأمر merge هنا.
+- stacks: مكدسات مطوية (.folded) بالميكروثانية لرسم flamegraph.
+- tracemalloc: لقطة الذاكرة (.tracemalloc) ومكدسات الحجز المطوية بالبايت.
+"""
+import argparse
+import contextlib
+import cProfile
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from itertools import count
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "stacks", "tracemalloc")
+DEFAULT_PROFILE_DIR = "profiles"
+# عدد إطارات المكدس المحفوظة لكل حجز في وضع tracemalloc
+TRACEMALLOC_FRAMES = 25
+
+# أداة تسجيل واحدة نشطة في العملية (sys.setprofile و tracemalloc عامة)
+_active_lock = threading.Lock()
+
+
+def frame_label(code):
+    """اسم الدالة ومكانها كعنصر في المكدس المطوي"""
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+class StackProfiler:
+    """أداة تسجيل حتمية تجمع الزمن الذاتي لكل مكدس استدعاء كامل
+
+    تعمل على الخيط الذي بدأها فقط، وتُخرج المكدسات بصيغة collapsed stacks.
+    """
+
+    def __init__(self):
+        # المكدس الكامل (صف من الأسماء) -> نانوثانية
+        self.stacks = {}
+        self._stack = [()]
+        self._last = 0
+
+    def enable(self):
+        self._last = time.perf_counter_ns()
+        sys.setprofile(self._callback)
+
+    def disable(self):
+        sys.setprofile(None)
+
+    def _callback(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        current = self._stack[-1]
+        if current:
+            self.stacks[current] = self.stacks.get(current, 0) + now - self._last
+
+        if event == "call":
+            self._stack.append(current + (frame_label(frame.f_code),))
+        elif event == "c_call":
+            name = getattr(arg, "__qualname__", None) or getattr(arg, "__name__", "?")
+            self._stack.append(current + (f"{name} (builtin)".replace(";", ":"),))
+        elif len(self._stack) > 1:
+            # return / c_return / c_exception (إطارات بدأت قبل التسجيل لا تُحذف)
+            self._stack.pop()
+
+        self._last = time.perf_counter_ns()
+
+    def folded_lines(self):
+        """سطر لكل مكدس: الأسماء مفصولة بـ ; ثم الزمن بالميكروثانية"""
+        return [
+            f"{';'.join(stack)} {nanoseconds // 1000}"
+            for stack, nanoseconds in sorted(self.stacks.items())
+            if nanoseconds >= 1000
+        ]
+
+
+def allocation_folded_lines(snapshot):
+    """مكدسات الحجز في لقطة tracemalloc مطوية بالبايت (الإطار الخارجي أولاً)"""
+    lines = []
+    for statistic in snapshot.statistics("traceback"):
+        frames = [
+            f"{os.path.basename(frame.filename)}:{frame.lineno}".replace(";", ":")
+            for frame in reversed(statistic.traceback)
+        ]
+        lines.append(f"{';'.join(frames)} {statistic.size}")
+    return lines
+
+
+class RequestProfiler:
+    """تسجيل ملفات أداء لطلبات مفردة
+
+    should_profile يقرر لكل طلب (مطلوب صراحة أو ضمن نسبة العينة)، و
+    profile يحيط بالطلب ويكتب ملفاته في output_dir. إذا كانت أداة تسجيل
+    أخرى نشطة في العملية يمر الطلب دون تسجيل بدل الانتظار.
+    """
+
+    def __init__(self, output_dir=DEFAULT_PROFILE_DIR, sample_rate=0.0, mode="cprofile"):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"وضع تسجيل غير معروف: {mode} (المتاح: {', '.join(PROFILE_MODES)})")
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"نسبة العينة يجب أن تكون بين 0 و 1: {sample_rate}")
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self._sequence = count(1)
+
+    def __getstate__(self):
+        # يُرسل إلى العمليات العاملة (initargs) و itertools.count لا يُنقل بـ pickle
+        # في كل الإصدارات؛ كل عملية تبدأ تسلسلها (أسماء الملفات تحمل رقم العملية)
+        state = self.__dict__.copy()
+        del state["_sequence"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._sequence = count(1)
+
+    def should_profile(self, requested=False):
+        """هل يُسجل هذا الطلب"""
+        return requested or (self.sample_rate > 0.0 and random.random() < self.sample_rate)
+
+    def next_path(self, label):
+        """مسار ملف جديد بدون امتداد (فريد لكل عملية وطلب)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._sequence):06d}"
+        return os.path.join(self.output_dir, name)
+
+    @contextlib.contextmanager
+    def profile(self, label="request", description=""):
+        """تسجيل ما يجري داخل الكتلة وكتابة ملفاته عند الخروج"""
+        if not _active_lock.acquire(blocking=False):
+            yield None
+            return
+
+        try:
+            if self.mode == "tracemalloc" and tracemalloc.is_tracing():
+                # tracemalloc يعمل لغرض آخر (مثل قياس الذاكرة في benchmark)
+                yield None
+                return
+
+            path = self.next_path(label)
+            recorder = self._start()
+            try:
+                yield path
+            finally:
+                written = self._finish(recorder, path)
+                logger.info("📈 ملف أداء %s: %s", ", ".join(written), description)
+        finally:
+            _active_lock.release()
+
+    def _start(self):
+        if self.mode == "cprofile":
+            recorder = cProfile.Profile()
+            recorder.enable()
+        elif self.mode == "stacks":
+            recorder = StackProfiler()
+            recorder.enable()
+        else:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            recorder = None
+        return recorder
+
+    def _finish(self, recorder, path):
+        """إيقاف التسجيل وكتابة الملفات، وإرجاع مساراتها"""
+        if self.mode == "cprofile":
+            recorder.disable()
+            recorder.dump_stats(path + ".prof")
+            return [path + ".prof"]
+
+        if self.mode == "stacks":
+            recorder.disable()
+            write_lines(path + ".folded", recorder.folded_lines())
+            return [path + ".folded"]
+
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # الحجوزات الباقية بعد الطلب فقط، دون ملفات tracemalloc نفسها
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        snapshot.dump(path + ".tracemalloc")
+        write_lines(path + ".alloc.folded", [f"# peak {peak}", *allocation_folded_lines(snapshot)])
+        return [path + ".tracemalloc", path + ".alloc.folded"]
+
+
+def write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(line + "\n" for line in lines)
+
+
+def merge_folded(paths):
+    """جمع ملفات المكدسات المطوية: المكدس -> مجموع القيم"""
+    totals = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                line = line.rstrip("\n")
+                if not line or line.startswith("#"):
+                    continue
+                stack, _, value = line.rpartition(" ")
+                totals[stack] = totals.get(stack, 0) + int(value)
+    return totals
+
+
+def merge_profiles(paths, output, limit=30):
+    """تجميع ملفات .prof أو .folded في ملف واحد وطباعة أعلى الدوال تكلفة"""
+    if all(path.endswith(".prof") for path in paths):
+        stats = pstats.Stats(*paths)
+        if output:
+            stats.dump_stats(output)
+        stats.sort_stats("cumulative").print_stats(limit)
+    elif all(path.endswith(".folded") for path in paths):
+        totals = merge_folded(paths)
+        lines = [f"{stack} {value}" for stack, value in sorted(totals.items())]
+        if output:
+            write_lines(output, lines)
+        else:
+            print("\n".join(lines))
+    else:
+        raise ValueError("لا يمكن خلط ملفات .prof و .folded في تجميع واحد")
+
+
+def main(argv=None):
+    """تجميع ملفات الأداء المسجلة من سطر الأوامر"""
+    parser = argparse.ArgumentParser(description="تجميع ملفات الأداء (.prof أو .folded)")
+    parser.add_argument("paths", nargs="+", help="ملفات الأداء")
+    parser.add_argument("--output", "-o", help="الملف المجمع (.prof أو .folded)")
+    parser.add_argument("--limit", type=int, default=30, help="عدد الدوال المطبوعة لملفات .prof")
+    args = parser.parse_args(argv)
+
+    try:
+        merge_profiles(args.paths, args.output, args.limit)
+    except ValueError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
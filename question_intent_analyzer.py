@@ -1,5 +1,22 @@
 import re
+from collections import namedtuple
 from arabic_normlizer import ArabicNormalizer
+from fuzzy_index import SymSpellIndex, original_span
+from metrics import NULL_TIMER
+from multi_pattern_matcher import AhoCorasickMatcher
+
+# تطابق واحد: نوعه (intent/topic)، اسم النية أو الموضوع، العبارة، موضعها في النص المطبع،
+# وهل جاء بعد تصحيح كلمة في النص
+PatternHit = namedtuple("PatternHit", ["kind", "name", "phrase", "span", "corrected"], defaults=(False,))
+
+# وزن التطابق بعد التصحيح في النقاط والثقة مقارنة بالتطابق الحرفي
+CORRECTED_HIT_WEIGHT = 0.5
+
+# نتيجة التحليل الكامل لسؤال واحد (غير قابلة للتعديل)
+AnalysisResult = namedtuple(
+    "AnalysisResult",
+    ["normalized_input", "intent", "topic", "confidence", "matched_phrases"]
+)
 
 class QuestionIntentAnalyzer:
     """محلل نية الأسئلة المتقدم"""
@@ -66,24 +83,113 @@ class QuestionIntentAnalyzer:
                 "إصعوبات التعلم", "صعوبات تعلم"
             ]
         }
+        
+        # فهرس الأنماط المطبعة - يُبنى مرة واحدة لأن القوائم ثابتة بعد التهيئة
+        self.intent_index = self.build_pattern_index(self.intent_patterns)
+        self.topic_index = self.build_pattern_index(self.topic_keywords)
+        self.matcher = self.build_matcher()
+        self.fuzzy_index = self.build_fuzzy_index()
     
-    def analyze_intent(self, user_input):
-        """تحليل نية السؤال"""
-        normalized_input = self.normalizer.normalize(user_input)
+    def build_pattern_index(self, patterns_map):
+        """بناء فهرس مطبع وخالٍ من التكرار لقوائم الأنماط
+        
+        كل عنصر في الفهرس: (النمط المطبع، عدد مرات تكراره، عدد كلماته).
+        عدد التكرار يحافظ على نفس النقاط التي كانت تُحسب للأنماط المكررة.
+        """
+        index = {}
+        for name, patterns in patterns_map.items():
+            counts = {}
+            for pattern in patterns:
+                normalized_pattern = self.normalizer.normalize(pattern)
+                if normalized_pattern:
+                    counts[normalized_pattern] = counts.get(normalized_pattern, 0) + 1
+            index[name] = [
+                (normalized_pattern, count, len(normalized_pattern.split()))
+                for normalized_pattern, count in counts.items()
+            ]
+        return index
+    
+    def build_matcher(self):
+        """بناء مطابق واحد لكل عبارات النيات والمواضيع"""
+        matcher = AhoCorasickMatcher()
+        self.pattern_weights = {}
+        
+        for kind, index in (("intent", self.intent_index), ("topic", self.topic_index)):
+            for name, entries in index.items():
+                for normalized_pattern, count, token_count in entries:
+                    matcher.add(normalized_pattern, (kind, name))
+                    self.pattern_weights[(kind, name, normalized_pattern)] = (count, token_count)
+        
+        matcher.build()
+        return matcher
+    
+    def build_fuzzy_index(self):
+        """فهرس تقريبي لكلمات كل عبارات النيات والمواضيع"""
+        fuzzy_index = SymSpellIndex()
+        for index in (self.intent_index, self.topic_index):
+            for entries in index.values():
+                for normalized_pattern, _, _ in entries:
+                    for word in normalized_pattern.split():
+                        fuzzy_index.add(word)
+        return fuzzy_index
+    
+    def find_matches(self, normalized_input):
+        """إيجاد كل تطابقات النيات والمواضيع في مرور واحد على النص المطبع"""
+        hits = [
+            PatternHit(kind, name, normalized_input[start:end], (start, end))
+            for start, end, (kind, name) in self.matcher.iter_matches(normalized_input)
+        ]
+        return hits + self.find_fuzzy_matches(normalized_input, hits)
+    
+    def find_fuzzy_matches(self, normalized_input, hits):
+        """تطابقات إضافية بعد تصحيح الكلمات التي لم تطابق أي عبارة (أخطاء الكتابة واللهجات)"""
+        spans = [hit.span for hit in hits]
+        
+        def is_matched(start, end, token):
+            return any(hit_start < end and start < hit_end for hit_start, hit_end in spans)
+        
+        corrected_input, corrections = self.fuzzy_index.correct(normalized_input, is_matched)
+        if not corrections:
+            return []
+        
+        fuzzy_hits = []
+        for start, end, (kind, name) in self.matcher.iter_matches(corrected_input):
+            # التطابقات التي لا تشمل كلمة مصححة موجودة بالفعل في النص الأصلي
+            if not any(correction.start < end and start < correction.end for correction in corrections):
+                continue
+            fuzzy_hits.append(PatternHit(kind, name, corrected_input[start:end], original_span(corrections, start, end), True))
+        return fuzzy_hits
+    
+    def matched_phrases(self, hits, kind):
+        """تجميع العبارات المتطابقة (بدون تكرار) لكل نية أو موضوع مع وزن كل عبارة
+        
+        العبارة التي طابقت حرفياً وزنها 1، والتي لم تطابق إلا بعد التصحيح
+        وزنها CORRECTED_HIT_WEIGHT.
+        """
+        phrases = {}
+        for hit in hits:
+            if hit.kind == kind:
+                weight = CORRECTED_HIT_WEIGHT if hit.corrected else 1.0
+                weights = phrases.setdefault(hit.name, {})
+                weights[hit.phrase] = max(weights.get(hit.phrase, 0.0), weight)
+        return phrases
+    
+    def score_intent(self, hits, normalized_input):
+        """اختيار النية من نتائج المطابقة"""
+        matched = self.matched_phrases(hits, "intent")
         
         # البحث عن أنماط النية مع حساب الأولوية
         intent_scores = {}
         
-        for intent, patterns in self.intent_patterns.items():
+        for intent in self.intent_index:
             score = 0
-            for pattern in patterns:
-                normalized_pattern = self.normalizer.normalize(pattern)
-                if normalized_pattern in normalized_input:
-                    # إعطاء نقاط أعلى للتطابق الدقيق
-                    if normalized_pattern == normalized_input:
-                        score += 5
-                    else:
-                        score += 2
+            for normalized_pattern, weight in matched.get(intent, {}).items():
+                count, _ = self.pattern_weights[("intent", intent, normalized_pattern)]
+                # إعطاء نقاط أعلى للتطابق الدقيق
+                if normalized_pattern == normalized_input:
+                    score += 5 * count * weight
+                else:
+                    score += 2 * count * weight
             intent_scores[intent] = score
         
         # إرجاع النية ذات أعلى نقاط
@@ -94,19 +200,18 @@ class QuestionIntentAnalyzer:
         
         return "general"
     
-    def extract_main_topic(self, user_input):
-        """استخراج الموضوع الرئيسي من السؤال"""
-        normalized_input = self.normalizer.normalize(user_input)
+    def score_topic(self, hits):
+        """اختيار الموضوع من نتائج المطابقة"""
+        matched = self.matched_phrases(hits, "topic")
         
         topic_scores = {}
         
-        for topic, keywords in self.topic_keywords.items():
+        for topic in self.topic_index:
             score = 0
-            for keyword in keywords:
-                normalized_keyword = self.normalizer.normalize(keyword)
-                if normalized_keyword in normalized_input:
-                    # إعطاء نقاط أعلى للكلمات الأطول (أكثر تحديداً)
-                    score += len(normalized_keyword.split())
+            for normalized_keyword, weight in matched.get(topic, {}).items():
+                count, token_count = self.pattern_weights[("topic", topic, normalized_keyword)]
+                # إعطاء نقاط أعلى للكلمات الأطول (أكثر تحديداً)
+                score += token_count * count * weight
             topic_scores[topic] = score
         
         # إرجاع الموضوع ذو أعلى نقاط
@@ -117,29 +222,59 @@ class QuestionIntentAnalyzer:
         
         return None
     
-    def get_confidence_score(self, user_input, intent, topic):
-        """حساب مستوى الثقة في التحليل"""
-        normalized_input = self.normalizer.normalize(user_input)
-        
+    def score_confidence(self, hits, normalized_input, intent, topic):
+        """حساب مستوى الثقة من نتائج المطابقة"""
         intent_confidence = 0
         topic_confidence = 0
         
         # حساب ثقة النية
-        if intent in self.intent_patterns:
-            for pattern in self.intent_patterns[intent]:
-                normalized_pattern = self.normalizer.normalize(pattern)
-                if normalized_pattern in normalized_input:
-                    intent_confidence += 1
+        if intent in self.intent_index:
+            for normalized_pattern, weight in self.matched_phrases(hits, "intent").get(intent, {}).items():
+                intent_confidence += self.pattern_weights[("intent", intent, normalized_pattern)][0] * weight
         
         # حساب ثقة الموضوع
-        if topic and topic in self.topic_keywords:
-            for keyword in self.topic_keywords[topic]:
-                normalized_keyword = self.normalizer.normalize(keyword)
-                if normalized_keyword in normalized_input:
-                    topic_confidence += 1
+        if topic and topic in self.topic_index:
+            for normalized_keyword, weight in self.matched_phrases(hits, "topic").get(topic, {}).items():
+                topic_confidence += self.pattern_weights[("topic", topic, normalized_keyword)][0] * weight
         
         # حساب النقاط الإجمالية
         total_words = len(normalized_input.split())
         confidence = (intent_confidence + topic_confidence) / max(total_words, 1)
         
         return min(confidence, 1.0)  # تحديد الحد الأقصى بـ 1.0
+    
+    def analyze_intent(self, user_input):
+        """تحليل نية السؤال"""
+        normalized_input = self.normalizer.normalize(user_input)
+        return self.score_intent(self.find_matches(normalized_input), normalized_input)
+    
+    def extract_main_topic(self, user_input):
+        """استخراج الموضوع الرئيسي من السؤال"""
+        normalized_input = self.normalizer.normalize(user_input)
+        return self.score_topic(self.find_matches(normalized_input))
+    
+    def get_confidence_score(self, user_input, intent, topic):
+        """حساب مستوى الثقة في التحليل"""
+        normalized_input = self.normalizer.normalize(user_input)
+        return self.score_confidence(self.find_matches(normalized_input), normalized_input, intent, topic)
+    
+    def analyze(self, user_input, timer=NULL_TIMER, normalized_input=None):
+        """تحليل النية والموضوع والثقة معاً بتطبيع واحد ومطابقة واحدة
+        
+        timer (اختياري) يسجل زمن كل مرحلة من مراحل التحليل، و normalized_input
+        (اختياري) هو السؤال بعد التطبيع إذا كان المستدعي قد طبعه.
+        """
+        if normalized_input is None:
+            normalized_input = self.normalizer.normalize(user_input)
+            timer.mark("normalize")
+        hits = self.find_matches(normalized_input)
+        timer.mark("match")
+        
+        intent = self.score_intent(hits, normalized_input)
+        timer.mark("intent")
+        topic = self.score_topic(hits)
+        timer.mark("topic")
+        confidence = self.score_confidence(hits, normalized_input, intent, topic)
+        timer.mark("confidence")
+        
+        return AnalysisResult(normalized_input, intent, topic, confidence, tuple(hits))
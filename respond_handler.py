@@ -1,240 +1,446 @@
+import asyncio
+import logging
 import re
-from datetime import datetime
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from arabic_normlizer import ArabicNormalizer
+from conversation_history import ConversationHistory
+from response_cache import ResponseCache
 from question_intent_analyzer import QuestionIntentAnalyzer
 from knowledge_base import SpecializedKnowledgeBase
+import response_renderer
+from response_renderer import MissingResponseError, make_response_id
+import metrics
+from metrics import NULL_TIMER, StageTimer
+
+logger = logging.getLogger(__name__)
+
+# مستويات الاسترجاع التي يمكن أن يأتي منها الرد
+TIER_SPECIALIZED = "specialized"
+TIER_TOPIC = "topic"
+TIER_FALLBACK = "fallback"
+TIER_PASSAGE = "passage"
+TIER_DEFAULT = "default"
+
+# الرد مع التحليل الذي بُني عليه ومستوى الاسترجاع الذي أجاب ومعرف الرد
+ChatResponse = namedtuple("ChatResponse", ["text", "analysis", "tier", "response_id"])
+# نفس الرد لكن نصه مولد أجزاء (sections) يُقرأ بالتدريج
+StreamedResponse = namedtuple("StreamedResponse", ["sections", "analysis", "tier", "response_id"])
+
+# نص سجل التاريخ الذي لم يعد رده موجوداً في قاعدة المعرفة الحالية
+HISTORY_RESPONSE_UNAVAILABLE = "⚠️ هذا الرد لم يعد متاحاً بعد تحديث الدليل أو قاعدة المعرفة"
+
+# ترتيب أولوية النيات للرد المبني على الموضوع
+INTENT_PRIORITY = ["treatment", "definition", "types", "symptoms"]
 
 class AdvancedResponseHandler:
-    def __init__(self, knowledge_base):
+    # أقل نقاط BM25 لقبول مقطع من الدليل كرد: في أسئلة benchmark_questions.txt
+    # المقاطع ذات الصلة تبدأ من 5.5 تقريباً وما دون 5.1 تطابق كلمة عابرة واحدة
+    MIN_PASSAGE_SCORE = 5.5
+    
+    def __init__(self, knowledge_base, intent_analyzer=None, history=None, response_cache=None, metrics_registry=None, profiler=None):
+        # قاعدة المعرفة والمحلل والذاكرة المؤقتة يمكن مشاركتها بين عدة معالجات
         self.kb = knowledge_base
         self.normalizer = ArabicNormalizer()
-        self.intent_analyzer = QuestionIntentAnalyzer()
-        self.conversation_history = []
+        self.intent_analyzer = intent_analyzer or QuestionIntentAnalyzer()
+        # أي مخزن يوفر append/clear والمرور على السجلات
+        self.conversation_history = history if history is not None else ConversationHistory()
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        # أزمنة المراحل والمستوى الذي أجاب (السجل المشترك للعملية افتراضياً)
+        self.metrics = metrics_registry if metrics_registry is not None else metrics.registry
+        # ملفات أداء لطلبات مختارة (RequestProfiler)؛ None يعني بدون أي تكلفة
+        self.profiler = profiler
+        # طلبات asyncio الجارية لكل سؤال مطبع
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
     
-    def process_user_input(self, user_input):
+    def process_user_input(self, user_input, profile=False):
         """معالجة متقدمة لمدخلات المستخدم مع التخصص الدقيق"""
+        return self.respond(user_input, profile).text
+    
+    def respond(self, user_input, profile=False):
+        """معالجة السؤال وإرجاع الرد مع التحليل ومستوى الاسترجاع
+        
+        profile=True يسجل ملف أداء لهذا الطلب إذا كان للمعالج profiler،
+        والطلبات الأخرى تُسجل حسب نسبة العينة فيه.
+        """
+        if self.profiler is not None and self.profiler.should_profile(profile):
+            with self.profiler.profile("respond", user_input):
+                return self._respond(user_input)
+        return self._respond(user_input)
+    
+    def _respond(self, user_input):
         user_input = user_input.strip()
         
-        # حفظ المحادثة
-        self.conversation_history.append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "user_input": user_input,
-            "response": None
-        })
+        # الرد يعتمد على السؤال بعد التطبيع فقط، فصيغ الكتابة المختلفة تشترك في نفس العنصر
+        timer = StageTimer()
+        cache_key = self.normalize_timed(user_input, timer)
+        result = self.lookup_response(user_input, cache_key, timer=timer)
+        
+        return self.record_response(user_input, result)
+    
+    def normalize_timed(self, user_input, timer):
+        """تطبيع السؤال (مفتاح الذاكرة المؤقتة) وتسجيله كمرحلة normalize"""
+        cache_key = self.normalizer.normalize(user_input)
+        timer.mark("normalize")
+        return cache_key
+    
+    def lookup_response(self, user_input, cache_key, analysis=None, timer=None):
+        """الرد من الذاكرة المؤقتة أو بحسابه: (التحليل، معرف الرد، المستوى، النص)
         
-        # تحليل النية والموضوع
-        intent = self.intent_analyzer.analyze_intent(user_input)
-        topic = self.intent_analyzer.extract_main_topic(user_input)
-        confidence = self.intent_analyzer.get_confidence_score(user_input, intent, topic)
+        timer (اختياري) هو مؤقت الطلب الذي سجل التطبيع (ومراحل التحليل إذا مُرر
+        analysis)، فيُستأنف هنا دون احتساب الانتظار قبل البحث.
+        """
+        if timer is None:
+            timer = StageTimer()
+        else:
+            timer.resume()
+        # نسخة واحدة من قاعدة المعرفة للطلب كله حتى لو أُعيد تحميلها أثناءه
+        kb = self.kb.snapshot
+        cached = self.response_cache.get(cache_key, kb.generation)
+        timer.mark("cache")
+        if cached is not None:
+            self.metrics.record_stages(timer, cached[2], cached=True)
+            return cached
         
-        print(f"🔍 تحليل السؤال: النية={intent}, الموضوع={topic}, الثقة={confidence:.2f}")
+        # تحليل النية والموضوع والثقة في مرور واحد
+        if analysis is None:
+            # مفتاح الذاكرة المؤقتة هو السؤال المطبع، فلا يُعاد تطبيعه في التحليل والبحث
+            analysis = self.intent_analyzer.analyze(user_input, timer, cache_key)
+        intent, topic, confidence = analysis.intent, analysis.topic, analysis.confidence
+        
+        logger.debug("🔍 تحليل السؤال: النية=%s, الموضوع=%s, الثقة=%.2f", intent, topic, confidence)
         
         # البحث المتخصص
-        response = self.get_specialized_response(user_input, intent, topic, confidence)
+        response_id, tier = self.resolve_response(user_input, intent, topic, confidence, kb, timer,
+                                                  analysis.normalized_input)
+        try:
+            response = self.render_response(response_id, kb)
+        except MissingResponseError:
+            # الدليل تغير على القرص قبل إعادة تحميل الفهرس؛ الرد الافتراضي بدلاً من نص خاطئ
+            response_id, tier = make_response_id("default", topic, intent), TIER_DEFAULT
+            response = self.render_response(response_id, kb)
+        timer.mark("render")
+        
+        result = (analysis, response_id, tier, response)
+        size = len(response.encode("utf-8")) + len(cache_key.encode("utf-8"))
+        self.response_cache.put(cache_key, result, size, kb.generation)
+        self.metrics.record_stages(timer, tier, cached=False)
+        return result
+    
+    def respond_stream(self, user_input):
+        """معالجة السؤال مع إرجاع نص الرد كمولد أجزاء بالترتيب
+        
+        الرد يُحسب ويُحفظ في الذاكرة المؤقتة مثل respond، والأجزاء (الرد
+        الأساسي ثم الاقتراحات) تُؤخذ من جدول الردود الجاهزة فلا يُبنى نص جديد.
+        """
+        user_input = user_input.strip()
+        timer = StageTimer()
+        cache_key = self.normalize_timed(user_input, timer)
+        result = self.lookup_response(user_input, cache_key, timer=timer)
+        response = self.record_response(user_input, result)
+        return StreamedResponse(self.iter_text_sections(response), response.analysis, response.tier,
+                                response.response_id)
+    
+    def iter_text_sections(self, response):
+        """أجزاء نص رد محسوب: من جدول الردود الجاهزة إذا كان نفس النص، وإلا النص كاملاً"""
+        rendered = self.kb.snapshot.rendered.get(response.response_id)
+        if rendered is not None and rendered.text is response.text:
+            return iter(rendered.sections)
+        return iter((response.text,))
+    
+    def record_response(self, user_input, result):
+        """حفظ المحادثة (بمعرف الرد فقط) وبناء الرد المنظم"""
+        analysis, response_id, tier, response = result
+        self.conversation_history.append(user_input, response_id, tier, self.kb.generation)
+        return ChatResponse(response, analysis, tier, response_id)
+    
+    def process_batch(self, user_inputs, max_workers=4):
+        """معالجة مجموعة أسئلة دفعة واحدة مع إرجاع الردود بنفس ترتيب المدخلات
+        
+        الأسئلة المتطابقة بعد التطبيع تُعالج مرة واحدة، ويُحلل الجميع أولاً
+        ثم يجري البحث للأسئلة المختلفة بالتوازي.
+        """
+        user_inputs = [user_input.strip() for user_input in user_inputs]
+        
+        # مؤقت لكل سؤال مختلف يبدأ بالتطبيع ثم التحليل ويكمل في lookup_response
+        cache_keys = []
+        unique_inputs = {}
+        timers = {}
+        for user_input in user_inputs:
+            timer = StageTimer()
+            cache_key = self.normalize_timed(user_input, timer)
+            cache_keys.append(cache_key)
+            # أول صيغة لكل سؤال مطبع
+            if cache_key not in unique_inputs:
+                unique_inputs[cache_key] = user_input
+                timers[cache_key] = timer
+        
+        analyses = {
+            cache_key: self.intent_analyzer.analyze(user_input, timers[cache_key], cache_key)
+            for cache_key, user_input in unique_inputs.items()
+        }
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                cache_key: executor.submit(
+                    self.lookup_response, user_input, cache_key, analyses[cache_key], timers[cache_key]
+                )
+                for cache_key, user_input in unique_inputs.items()
+            }
+            results = {cache_key: future.result() for cache_key, future in futures.items()}
+        
+        return [
+            self.record_response(user_input, results[cache_key])
+            for user_input, cache_key in zip(user_inputs, cache_keys)
+        ]
+    
+    async def arespond(self, user_input):
+        """نسخة asyncio من respond: البحث يجري في منفذ الخيوط دون حجب الحلقة
+        
+        الطلبات المتزامنة لنفس السؤال المطبع تنتظر نفس الحساب بدلاً من تكراره.
+        """
+        user_input = user_input.strip()
+        timer = StageTimer()
+        cache_key = self.normalize_timed(user_input, timer)
         
-        # تحديث تاريخ المحادثة
-        self.conversation_history[-1]["response"] = response
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                # الحساب المشترك لا يُلغى: إلغاء أحد المنتظرين لا يصل لغيره
+                future.set_running_or_notify_cancel()
+                self._inflight[cache_key] = future
         
-        return response
+        if is_owner:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self._complete_lookup, future, user_input, cache_key, timer)
+        
+        # shield: إلغاء هذا الطلب (مثل انتهاء مهلته) يلغي انتظاره فقط
+        result = await asyncio.shield(asyncio.wrap_future(future))
+        return self.record_response(user_input, result)
+    
+    async def aprocess_user_input(self, user_input):
+        """نسخة asyncio من process_user_input"""
+        return (await self.arespond(user_input)).text
+    
+    async def aprocess_batch(self, user_inputs, max_workers=4):
+        """نسخة asyncio من process_batch"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.process_batch, user_inputs, max_workers)
+    
+    def _complete_lookup(self, future, user_input, cache_key, timer=None):
+        """حساب الرد لطلب asyncio وتسليمه لكل من ينتظره"""
+        try:
+            result = self.lookup_response(user_input, cache_key, timer=timer)
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
     
     def get_specialized_response(self, user_input, intent, topic, confidence):
         """الحصول على رد متخصص بناءً على التحليل"""
+        kb = self.kb.snapshot
+        response_id, _ = self.resolve_response(user_input, intent, topic, confidence, kb)
+        return self.render_response(response_id, kb)
+    
+    def resolve_response(self, user_input, intent, topic, confidence, kb=None, timer=NULL_TIMER,
+                         normalized_input=None):
+        """اختيار الرد ومستوى الاسترجاع الذي أجاب (معرف الرد، المستوى)
+        
+        normalized_input (اختياري) هو السؤال بعد التطبيع إذا كان محسوباً مسبقاً.
+        """
+        if kb is None:
+            kb = self.kb.snapshot
         
         # إذا كان التحليل واضح ومؤكد
         if confidence > 0.7 and topic and intent:
-            specialized_response = self.kb.get_specialized_response(topic, intent)
-            if specialized_response:
-                return self.enhance_response_with_suggestions(specialized_response, topic, intent)
+            found = kb.get_specialized_response(topic, intent)
+            timer.mark("specialized_tier")
+            if found:
+                return make_response_id("specialized", topic, intent), TIER_SPECIALIZED
         
         # إذا كان الموضوع واضح لكن النية غير مؤكدة
         if topic and confidence > 0.5:
-            return self.get_topic_based_response(topic, intent)
+            topic_response_id = self.resolve_topic_based_response(topic, intent, kb)
+            timer.mark("topic_tier")
+            # مواضيع بلا محتوى في القاعدة تكمل إلى البحث الاحتياطي
+            if topic_response_id:
+                return topic_response_id, TIER_TOPIC
         
         # البحث التقليدي كخطة احتياطية
-        fallback_response = self.fallback_search(user_input)
-        if fallback_response:
-            return fallback_response
+        fallback_entry = self.fallback_search_entry(user_input, kb, normalized_input, intent)
+        timer.mark("fallback_tier")
+        if fallback_entry:
+            return make_response_id("entry", *fallback_entry), TIER_FALLBACK
+        
+        # البحث في نص الدليل الكامل
+        passage_id = self.passage_search_id(user_input, kb, normalized_input)
+        timer.mark("passage_tier")
+        if passage_id is not None:
+            return make_response_id("passage", passage_id), TIER_PASSAGE
         
         # الرد الافتراضي المحسن
-        return self.get_enhanced_default_response(user_input, intent, topic)
+        response_id = make_response_id("default", topic, intent)
+        timer.mark("default_tier")
+        return response_id, TIER_DEFAULT
+    
+    def render_response(self, response_id, kb=None):
+        """بناء نص الرد من معرفه (من جدول الردود الجاهزة إن وُجد فيه)"""
+        if kb is None:
+            kb = self.kb.snapshot
+        rendered = kb.rendered.get(response_id)
+        if rendered is not None:
+            return rendered.text
+        return "".join(response_renderer.iter_response_sections(response_id, kb.knowledge, kb.get_passage))
+    
+    def iter_response_sections(self, response_id, kb=None):
+        """أجزاء نص الرد بالترتيب (دمجها يعطي render_response)"""
+        if kb is None:
+            kb = self.kb.snapshot
+        rendered = kb.rendered.get(response_id)
+        if rendered is not None:
+            return iter(rendered.sections)
+        return response_renderer.iter_response_sections(response_id, kb.knowledge, kb.get_passage)
     
     def get_topic_based_response(self, topic, intent):
         """الحصول على رد مبني على الموضوع حتى لو كانت النية غير واضحة"""
-        
-        # ترتيب أولوية النيات
-        intent_priority = ["treatment", "definition", "types", "symptoms"]
+        kb = self.kb.snapshot
+        response_id = self.resolve_topic_based_response(topic, intent, kb)
+        return self.render_response(response_id, kb) if response_id else None
+    
+    def resolve_topic_based_response(self, topic, intent, kb=None):
+        """معرف الرد المبني على الموضوع أو None"""
+        if kb is None:
+            kb = self.kb.snapshot
         
         # جرب النية المحددة أولاً
         if intent != "general":
-            response = self.kb.get_specialized_response(topic, intent)
-            if response:
-                return response
+            if kb.get_specialized_response(topic, intent):
+                return make_response_id("entry", topic, intent)
         
         # جرب النيات حسب الأولوية
-        for priority_intent in intent_priority:
-            response = self.kb.get_specialized_response(topic, priority_intent)
-            if response:
-                return f"**ملاحظة**: لم أجد معلومات محددة لسؤالك، لكن إليك معلومات مفيدة عن {topic}:\n\n{response}"
+        for priority_intent in INTENT_PRIORITY:
+            if kb.get_specialized_response(topic, priority_intent):
+                return make_response_id("topic", topic, priority_intent)
         
         return None
     
-    def enhance_response_with_suggestions(self, response, topic, intent):
+    def enhance_response_with_suggestions(self, response, topic, intent, kb=None):
         """تحسين الرد بإضافة اقتراحات ذات صلة"""
+        if kb is None:
+            kb = self.kb.snapshot
+        return response + "".join(response_renderer.iter_suggestion_sections(kb.knowledge, topic, intent))
+    
+    def get_related_suggestions(self, topic, current_intent, kb=None):
+        """الحصول على اقتراحات ذات صلة بالموضوع (من ملف قاعدة المعرفة)"""
+        if kb is None:
+            kb = self.kb.snapshot
+        return list(kb.knowledge.get_suggestions(topic, current_intent))
+    
+    def fallback_search(self, user_input):
+        """البحث الاحتياطي في حالة فشل التحليل المتخصص"""
+        kb = self.kb.snapshot
+        best_entry = self.fallback_search_entry(user_input, kb)
+        if best_entry is None:
+            return None
         
-        suggestions = self.get_related_suggestions(topic, intent)
-        
-        if suggestions:
-            response += "\n\n💡 **اقتراحات إضافية قد تهمك:**\n"
-            for suggestion in suggestions:
-                response += f"• {suggestion}\n"
-        
-        return response
-    
-    def get_related_suggestions(self, topic, current_intent):
-        """الحصول على اقتراحات ذات صلة بالموضوع"""
-        
-        suggestions_map = {
-            "الإدراك": {
-                "treatment": [
-                    "هل تريد معرفة تدريبات التمييز البصري المحددة؟",
-                    "هل تحتاج معلومات عن التآزر البصري الحركي؟",
-                    "هل تريد تمارين للإدراك السمعي؟"
-                ],
-                "definition": [
-                    "هل تريد معرفة طرق علاج مشاكل الإدراك؟",
-                    "هل تحتاج معلومات عن أنواع الإدراك المختلفة؟"
-                ]
-            },
-            "الانتباه": {
-                "treatment": [
-                    "هل تريد تدريبات لزيادة مدة الانتباه؟",
-                    "هل تحتاج أنشطة لتحسين مرونة الانتباه؟",
-                    "هل تريد علاج مشاكل التشتت المحددة؟"
-                ],
-                "definition": [
-                    "هل تريد معرفة طرق علاج مشاكل الانتباه؟",
-                    "هل تحتاج معلومات عن أنواع الانتباه المختلفة؟"
-                ]
-            },
-            "الذاكرة": {
-                "treatment": [
-                    "هل تريد تدريبات الذاكرة قصيرة المدى؟",
-                    "هل تحتاج تمارين الذاكرة العاملة المتقدمة؟",
-                    "هل تريد نصائح لتحسين العوامل المؤثرة على الذاكرة؟"
-                ],
-                "definition": [
-                    "هل تريد معرفة طرق علاج مشاكل الذاكرة؟",
-                    "هل تحتاج معلومات عن أنواع الذاكرة المختلفة؟"
-                ]
-            },
-            "الكتابة": {
-                "treatment": [
-                    "هل تريد تفاصيل أكثر عن طريقة التنقيط؟",
-                    "هل تحتاج تدريبات للحروف المتشابهة؟",
-                    "هل تريد برنامج أسبوعي للإملاء؟"
-                ]
-            }
-        }
+        topic, intent = best_entry
+        return kb.get_specialized_response(topic, intent)
+    
+    def fallback_search_entry(self, user_input, kb=None, normalized_input=None, intent=None):
+        """أفضل مدخل (الموضوع، النية) في البحث الاحتياطي أو None
         
-        if topic in suggestions_map and current_intent in suggestions_map[topic]:
-            return suggestions_map[topic][current_intent]
+        intent (اختياري) هي النية المحللة من السؤال، ومدخلاتها تتقدم على غيرها.
+        """
+        if kb is None:
+            kb = self.kb.snapshot
+        if normalized_input is None:
+            normalized_input = self.normalizer.normalize(user_input)
         
-        return []
+        # الفهرس المقلوب مع ترتيب TF-IDF عند غياب الكلمات المفتاحية بدلاً من المرور على كل المواضيع والنيات
+        return kb.fallback_index.search(normalized_input, intent)
     
-    def fallback_search(self, user_input):
-        """البحث الاحتياطي في حالة فشل التحليل المتخصص"""
-        normalized_input = self.normalizer.normalize(user_input)
-        
-        # البحث في جميع المواضيع والنيات
-        best_response = None
-        max_score = 0
-        
-        for topic in self.kb.get_all_topics():
-            for intent in self.kb.get_available_intents_for_topic(topic):
-                topic_data = self.kb.knowledge_dict[topic][intent]
-                score = 0
-                
-                for keyword in topic_data["keywords"]:
-                    normalized_keyword = self.normalizer.normalize(keyword)
-                    
-                    if normalized_keyword in normalized_input:
-                        score += 3
-                    elif any(word in normalized_keyword for word in normalized_input.split()):
-                        score += 1
-                
-                if score > max_score:
-                    max_score = score
-                    best_response = topic_data["response"]
-        
-        return best_response if max_score > 0 else None
-    
-    def get_enhanced_default_response(self, user_input, intent, topic):
-        """رد افتراضي محسن مع اقتراحات ذكية"""
+    def fallback_search_ranked(self, user_input, top_k=3, kb=None):
+        """أفضل مدخلات البحث الاحتياطي مع نقاطها: [(الموضوع، النية، النقاط)]"""
+        if kb is None:
+            kb = self.kb.snapshot
+        return kb.search_entries(self.normalizer.normalize(user_input), top_k)
+    
+    def passage_search(self, user_input):
+        """البحث عن أقرب مقطع في الدليل التربوي قبل الرد الافتراضي"""
+        kb = self.kb.snapshot
+        passage_id = self.passage_search_id(user_input, kb)
+        if passage_id is None:
+            return None
+        return self.format_passage(kb.get_passage(passage_id))
+    
+    def passage_search_id(self, user_input, kb=None, normalized_input=None):
+        """رقم أقرب مقطع في الدليل إذا تجاوز الحد الأدنى للنقاط، أو None"""
+        if kb is None:
+            kb = self.kb.snapshot
+        if normalized_input is None:
+            normalized_input = self.normalizer.normalize(user_input)
         
-        base_message = "عذراً، لم أفهم سؤالك بوضوح."
-        
-        # اقتراحات بناءً على التحليل الجزئي
-        suggestions = []
-        
-        if topic:
-            suggestions.append(f"**يبدو أن سؤالك يتعلق بـ {topic}. يمكنك السؤال عن:**")
-            if topic == "الإدراك":
-                suggestions.extend([
-                    "• كيف أعالج مشاكل الإدراك؟",
-                    "• ما هو الإدراك البصري؟",
-                    "• أنواع الإدراك السمعي"
-                ])
-            elif topic == "الانتباه":
-                suggestions.extend([
-                    "• كيف أعالج مشاكل الانتباه؟",
-                    "• ما هو الانتباه الانتقائي؟",
-                    "• طرق تحسين مدة الانتباه"
-                ])
-            elif topic == "الذاكرة":
-                suggestions.extend([
-                    "• كيف أعالج مشاكل الذاكرة؟",
-                    "• ما هي الذاكرة العاملة؟",
-                    "• تدريبات تقوية الذاكرة"
-                ])
-        
-        if intent and intent != "general":
-            if intent == "treatment":
-                suggestions.append("**يبدو أنك تبحث عن طرق العلاج. جرب:**")
-                suggestions.extend([
-                    "• كيف أعالج مشاكل الإدراك؟",
-                    "• طرق علاج الانتباه",
-                    "• تدريبات تحسين الذاكرة"
-                ])
-        
-        if not suggestions:
-            suggestions = [
-                "**💡 يمكنك السؤال عن:**",
-                "",
-                "**للعلاج والحلول:**",
-                "• كيف أعالج مشاكل الإدراك؟",
-                "• طرق علاج الانتباه",
-                "• كيفية تحسين الكتابة والإملاء",
-                "",
-                "**للتعريفات:**",
-                "• ما هو الإدراك؟",
-                "• تعريف الانتباه",
-                "• مفهوم الذاكرة",
-                "",
-                "**للأنواع والتصنيفات:**",
-                "• أنواع الإدراك",
-                "• أنواع مشاكل الانتباه"
-            ]
-        
-        return f"{base_message}\n\n" + "\n".join(suggestions) + "\n\n🔄 **جرب إعادة صياغة السؤال بوضوح أكثر**"
+        results = kb.search_passages(normalized_input, top_k=1)
+        if not results or results[0][1] < self.MIN_PASSAGE_SCORE:
+            return None
+        return results[0][0]
+    
+    def format_passage(self, passage):
+        """تنسيق مقطع من الدليل كرد"""
+        return "".join(response_renderer.iter_passage_sections(passage))
+    
+    def get_enhanced_default_response(self, user_input, intent, topic, kb=None):
+        """رد افتراضي محسن مع اقتراحات ذكية"""
+        if kb is None:
+            kb = self.kb.snapshot
+        rendered = kb.rendered.get(make_response_id("default", topic, intent))
+        if rendered is not None:
+            return rendered.text
+        return "".join(response_renderer.iter_default_sections(kb.knowledge, intent, topic))
     
     def get_conversation_history(self):
-        """إرجاع تاريخ المحادثة"""
-        return self.conversation_history
+        """إرجاع تاريخ المحادثة
+        
+        الردود تُبنى من معرفاتها على النسخة الحالية لقاعدة المعرفة؛ المعرف
+        الذي لم يعد له محتوى بعد إعادة التحميل يظهر كملاحظة بدل نص خاطئ.
+        """
+        kb = self.kb.snapshot
+        return [
+            {
+                "timestamp": record.formatted_timestamp(),
+                "user_input": record.user_input,
+                "response": self.render_history_response(record, kb),
+                "generation": record.generation,
+            }
+            for record in self.conversation_history
+        ]
+    
+    def render_history_response(self, record, kb):
+        """نص رد محفوظ في التاريخ أو ملاحظة إذا لم يعد متاحاً
+        
+        معرفات المقاطع أرقام مواضع في فهرس النسخة التي أجابت، فلا تُعرض على
+        نسخة أخرى. باقي المعرفات بأسماء المواضيع والنيات وتبقى صالحة.
+        """
+        if (record.generation is not None and record.generation != kb.generation
+                and record.response_id.startswith("passage:")):
+            return HISTORY_RESPONSE_UNAVAILABLE
+        try:
+            return self.render_response(record.response_id, kb)
+        except MissingResponseError:
+            return HISTORY_RESPONSE_UNAVAILABLE
     
     def multi_level_search(self, user_input):
         """دالة للتوافق مع الكود القديم"""
-        intent = self.intent_analyzer.analyze_intent(user_input)
-        topic = self.intent_analyzer.extract_main_topic(user_input)
+        topic = self.intent_analyzer.analyze(user_input).topic
         
         if topic and topic in self.kb.knowledge_dict:
             return topic
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """ذاكرة مؤقتة للردود مفتاحها السؤال بعد التطبيع
+
+    الإخراج بالأقدم استخداماً (LRU) مع مدة صلاحية (TTL) وحدود لعدد
+    العناصر وحجمها بالبايت. كل عنصر مرتبط بإصدار قاعدة المعرفة (رقم
+    متزايد)، وعند ظهور إصدار أحدث تُمسح الذاكرة كاملة، أما الطلبات التي
+    ما زالت تعمل على إصدار أقدم فلا تقرأ ولا تكتب. آمنة للاستخدام من عدة خيوط.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """إرجاع القيمة المخزنة أو None"""
+        with self._lock:
+            entry = self.entries.get(key) if self._check_version(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size, version):
+        """تخزين قيمة بحجمها التقريبي بالبايت"""
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if not self._check_version(version):
+                return
+
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.total_bytes += size
+
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        """مسح كل العناصر"""
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """إحصائيات الاستخدام"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _check_version(self, version):
+        """إبطال كل العناصر إذا أُعيد تحميل قاعدة المعرفة، وإرجاع هل الإصدار هو الحالي"""
+        if self.version is None or version > self.version:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.version = version
+        return version == self.version
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
@@ -0,0 +1,127 @@
+import json
+import sys
+from collections import namedtuple
+
+class MissingResponseError(LookupError):
+    """معرف رد لم يعد له محتوى (حُذف المدخل أو تغير الدليل بعد إعادة التحميل)"""
+
+
+# رد جاهز: أجزاؤه بالترتيب، ونصه كاملاً، ونصه مرمزاً كقيمة JSON بـ UTF-8
+RenderedResponse = namedtuple("RenderedResponse", ["sections", "text", "json"])
+
+SUGGESTIONS_HEADING = "\n\n💡 **اقتراحات إضافية قد تهمك:**\n"
+PASSAGE_HEADER = "**📖 من الدليل التربوي:**\n\n"
+PASSAGE_FOOTER = "\n\n🔄 **إذا لم تكن هذه الإجابة المطلوبة، جرب إعادة صياغة السؤال**"
+DEFAULT_HEADER = "عذراً، لم أفهم سؤالك بوضوح.\n\n"
+DEFAULT_FOOTER = "\n\n🔄 **جرب إعادة صياغة السؤال بوضوح أكثر**"
+
+
+def make_response_id(kind, *parts):
+    """معرف نصي للرد يكفي لإعادة بنائه، مثل specialized:الإدراك:treatment"""
+    return ":".join([kind, *(str(part) if part is not None else "" for part in parts)])
+
+
+def iter_suggestion_sections(knowledge, topic, intent):
+    """جزء الاقتراحات ذات الصلة (لا شيء إذا لم توجد)"""
+    suggestions = knowledge.get_suggestions(topic, intent)
+    if suggestions:
+        yield SUGGESTIONS_HEADING + "".join(f"• {suggestion}\n" for suggestion in suggestions)
+
+
+def iter_passage_sections(passage):
+    """أجزاء رد المقطع: العنوان ثم نص المقطع ثم التذييل"""
+    yield PASSAGE_HEADER
+    yield passage
+    yield PASSAGE_FOOTER
+
+
+def iter_default_sections(knowledge, intent, topic):
+    """أجزاء الرد الافتراضي: الاعتذار ثم الاقتراحات ثم التذييل"""
+    yield DEFAULT_HEADER
+
+    # اقتراحات بناءً على التحليل الجزئي
+    suggestions = []
+
+    if topic:
+        suggestions.append(f"**يبدو أن سؤالك يتعلق بـ {topic}. يمكنك السؤال عن:**")
+        suggestions.extend(f"• {prompt}" for prompt in knowledge.get_topic_prompts(topic))
+
+    if intent and intent != "general":
+        intent_prompts = knowledge.get_intent_prompts(intent)
+        if intent_prompts:
+            heading, prompts = intent_prompts
+            suggestions.append(f"**{heading}**")
+            suggestions.extend(f"• {prompt}" for prompt in prompts)
+
+    if not suggestions:
+        suggestions = ["**💡 يمكنك السؤال عن:**"]
+        for heading, prompts in knowledge.general_prompts:
+            suggestions.append("")
+            suggestions.append(f"**{heading}**")
+            suggestions.extend(f"• {prompt}" for prompt in prompts)
+
+    yield "\n".join(suggestions)
+    yield DEFAULT_FOOTER
+
+
+def iter_response_sections(response_id, knowledge, get_passage=None):
+    """أجزاء نص الرد من معرفه بالترتيب (get_passage لردود مقاطع الدليل)"""
+    kind, _, rest = response_id.partition(":")
+
+    if kind == "passage":
+        passage = get_passage(int(rest))
+        if passage is None:
+            raise MissingResponseError(response_id)
+        yield from iter_passage_sections(passage)
+        return
+
+    topic, _, intent = rest.partition(":")
+    topic = topic or None
+    intent = intent or None
+
+    if kind in ("specialized", "entry", "topic"):
+        response = knowledge.get_response(topic, intent)
+        if response is None:
+            raise MissingResponseError(response_id)
+
+    if kind == "specialized":
+        yield response
+        yield from iter_suggestion_sections(knowledge, topic, intent)
+    elif kind == "entry":
+        yield response
+    elif kind == "topic":
+        yield f"**ملاحظة**: لم أجد معلومات محددة لسؤالك، لكن إليك معلومات مفيدة عن {topic}:\n\n"
+        yield response
+    elif kind == "default":
+        yield from iter_default_sections(knowledge, intent, topic)
+    else:
+        raise ValueError(f"معرف رد غير معروف: {response_id}")
+
+
+def render(sections):
+    """رد جاهز من أجزائه"""
+    sections = tuple(sections)
+    text = sections[0] if len(sections) == 1 else "".join(sections)
+    return RenderedResponse(sections, text, json.dumps(text, ensure_ascii=False).encode("utf-8"))
+
+
+def precompute_responses(knowledge):
+    """كل الردود التي تُبنى من قاعدة المعرفة وحدها: معرف الرد -> RenderedResponse
+
+    تشمل الرد المتخصص والمدخل والرد المبني على الموضوع لكل (موضوع، نية)،
+    والرد الافتراضي لكل موضوع ونية في القاعدة (ومع عدمهما). ردود مقاطع
+    الدليل والمواضيع التي لا تعرفها القاعدة تُبنى عند الطلب.
+    """
+    response_ids = []
+    for topic, intents in knowledge.knowledge_dict.items():
+        for intent in intents:
+            response_ids.extend(make_response_id(kind, topic, intent) for kind in ("specialized", "entry", "topic"))
+
+    for topic in (*knowledge.topic_names, None):
+        for intent in (*knowledge.intent_names, "general", None):
+            response_ids.append(make_response_id("default", topic, intent))
+
+    return {
+        sys.intern(response_id): render(iter_response_sections(response_id, knowledge))
+        for response_id in response_ids
+    }
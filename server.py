@@ -0,0 +1,514 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from conversation_history import ConversationHistory
+from knowledge_base import default_index_path
+from profiling import DEFAULT_PROFILE_DIR, PROFILE_MODES, RequestProfiler
+from respond_handler import AdvancedResponseHandler
+from shared_resources import get_shared_resources
+
+logger = logging.getLogger(__name__)
+
+# أطول سطر في الطلب (سطر الطلب أو رأس واحد) وأكبر حجم للجسم
+MAX_LINE_BYTES = 8 * 1024
+MAX_HEADERS = 100
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SIZE = 256
+
+# مهلة انتظار الطلب التالي على اتصال مفتوح، ومهلة قراءة طلب كامل ومعالجته
+KEEP_ALIVE_TIMEOUT = 5.0
+READ_TIMEOUT = 10.0
+REQUEST_TIMEOUT = 10.0
+
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+NDJSON_CONTENT_TYPE = "application/x-ndjson; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class HttpError(Exception):
+    """خطأ يُرد على العميل بحالة HTTP ورسالة JSON"""
+
+    def __init__(self, status, message=None, headers=()):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+        self.headers = list(headers)
+
+
+class Request:
+    """طلب HTTP مقروء: الطريقة والمسار والاستعلام والرؤوس (بأحرف صغيرة) والجسم"""
+
+    __slots__ = ("method", "path", "query", "version", "headers", "body")
+
+    def __init__(self, method, target, version, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = parse_qs(url.query)
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def keep_alive(self):
+        """هل يبقى الاتصال مفتوحاً بعد هذا الطلب"""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self):
+        """جسم الطلب كقاموس JSON"""
+        try:
+            data = json.loads(self.body or b"{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"JSON غير صالح: {e}")
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "جسم الطلب يجب أن يكون كائن JSON")
+        return data
+
+
+class SessionStore:
+    """تاريخ المحادثة لكل جلسة، محدود العدد (تُحذف الجلسة الأقدم استخداماً)
+
+    يُستخدم من حلقة asyncio فقط، فلا يحتاج قفلاً.
+    """
+
+    def __init__(self, max_sessions=10000, max_records=50):
+        self.max_sessions = max_sessions
+        self.max_records = max_records
+        self.sessions = OrderedDict()
+
+    def get(self, session_id):
+        """تاريخ الجلسة (يُنشأ عند أول استخدام)"""
+        history = self.sessions.get(session_id)
+        if history is None:
+            if len(self.sessions) >= self.max_sessions:
+                self.sessions.popitem(last=False)
+            history = self.sessions[session_id] = ConversationHistory(max_records=self.max_records)
+        else:
+            self.sessions.move_to_end(session_id)
+        return history
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class ChatServer:
+    """خادم HTTP/JSON على asyncio فوق قاعدة معرفة ومحلل مشتركين
+
+    المسارات:
+    - POST /answer  {"question", "session_id"?, "profile"?, "stream"?}
+    - POST /batch   {"questions": [...]}
+    - GET  /history?session_id=...
+    - GET  /metrics (صيغة Prometheus)، GET /health
+
+    الحساب يجري في منفذ خيوط، والحلقة تقرأ وتكتب فقط. الطلبات فوق
+    max_pending تُرفض فوراً بـ 503 بدل أن تتراكم، والاتصالات فوق
+    max_connections تُغلق بعد رد 503.
+    
+    مع "stream": true يُرسل الرد بـ Transfer-Encoding: chunked كسطور JSON:
+    سطر التحليل أولاً ثم سطر لكل جزء من النص ({"section": ...}).
+    """
+
+    def __init__(self, handler, sessions=None, max_pending=256, max_connections=1024,
+                 request_timeout=REQUEST_TIMEOUT, keep_alive_timeout=KEEP_ALIVE_TIMEOUT,
+                 read_timeout=READ_TIMEOUT):
+        self.handler = handler
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.max_pending = max_pending
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.read_timeout = read_timeout
+        self.pending = 0
+        self.connections = 0
+        self.routes = {
+            ("POST", "/answer"): self.answer,
+            ("POST", "/batch"): self.batch,
+            ("GET", "/history"): self.history,
+            ("GET", "/metrics"): self.metrics_endpoint,
+            ("GET", "/health"): self.health,
+        }
+
+    async def handle_connection(self, reader, writer):
+        """خدمة اتصال واحد: طلبات متتالية حتى الإغلاق أو انتهاء المهلة"""
+        self.connections += 1
+        try:
+            if self.connections > self.max_connections:
+                await self.send_error(writer, HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "عدد الاتصالات تجاوز الحد",
+                                                        [("Retry-After", "1")]), keep_alive=False)
+                return
+
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self.read_request(reader)
+                except HttpError as e:
+                    await self.send_error(writer, e, keep_alive=False)
+                    return
+                if request is None:
+                    return
+
+                keep_alive = request.keep_alive()
+                status, headers, body = await self.dispatch(request)
+                # المسارات غير المعروفة تُجمع تحت تسمية واحدة حتى لا تتضخم المقاييس
+                path = request.path if any(path == request.path for _, path in self.routes) else "other"
+                self.handler.metrics.increment("chatbot_http_requests_total", path=path, status=status.value)
+                await self.send(writer, status, headers, body, keep_alive, chunked=request.version == "HTTP/1.1")
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_request(self, reader):
+        """قراءة طلب كامل، أو None إذا أُغلق الاتصال أو انتهت مهلة الانتظار"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+        except asyncio.TimeoutError:
+            return None
+        except ValueError:
+            raise HttpError(HTTPStatus.REQUEST_URI_TOO_LONG)
+        if not request_line:
+            return None
+
+        try:
+            return await asyncio.wait_for(self.read_rest(reader, request_line), self.read_timeout)
+        except asyncio.TimeoutError:
+            raise HttpError(HTTPStatus.REQUEST_TIMEOUT)
+        except ValueError:
+            # سطر أطول من حد القارئ
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    async def read_rest(self, reader, request_line):
+        """الرؤوس والجسم بعد سطر الطلب"""
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "سطر طلب غير صالح")
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise HttpError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, separator, value = line.decode("latin-1").partition(":")
+            if not separator:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "رأس غير صالح")
+            headers[name.strip().lower()] = value.strip()
+
+        if "transfer-encoding" in headers:
+            raise HttpError(HTTPStatus.NOT_IMPLEMENTED, "الطلبات المجزأة غير مدعومة، استخدم Content-Length")
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length غير صالح")
+        if length < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length غير صالح")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b""
+
+        return Request(method.upper(), target, version, headers, body)
+
+    async def dispatch(self, request):
+        """تنفيذ المسار وإرجاع (الحالة، الرؤوس، الجسم)"""
+        route = self.routes.get((request.method, request.path))
+        if route is None:
+            allowed = [method for method, path in self.routes if path == request.path]
+            if allowed:
+                error = HttpError(HTTPStatus.METHOD_NOT_ALLOWED, headers=[("Allow", ", ".join(allowed))])
+            else:
+                error = HttpError(HTTPStatus.NOT_FOUND)
+            return self.error_response(error)
+
+        if self.pending >= self.max_pending:
+            return self.error_response(HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "الخادم مشغول",
+                                                 [("Retry-After", "1")]))
+
+        self.pending += 1
+        try:
+            return await asyncio.wait_for(route(request), self.request_timeout)
+        except HttpError as e:
+            return self.error_response(e)
+        except asyncio.TimeoutError:
+            return self.error_response(HttpError(HTTPStatus.GATEWAY_TIMEOUT, "انتهت مهلة معالجة الطلب"))
+        except Exception:
+            logger.exception("خطأ أثناء معالجة %s %s", request.method, request.path)
+            return self.error_response(HttpError(HTTPStatus.INTERNAL_SERVER_ERROR))
+        finally:
+            self.pending -= 1
+
+    async def answer(self, request):
+        data = request.json()
+        question = data.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise HttpError(HTTPStatus.BAD_REQUEST, "الحقل question مطلوب")
+
+        session_id = str(data.get("session_id") or request.headers.get("x-session-id") or uuid.uuid4().hex)
+        if data.get("stream"):
+            return await self.answer_stream(question, session_id)
+        profile = bool(data.get("profile"))
+
+        if self.handler.profiler is not None and self.handler.profiler.should_profile(profile):
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(None, self.handler.respond, question, True)
+        else:
+            response = await self.handler.arespond(question)
+
+        self.sessions.get(session_id).append(question.strip(), response.response_id, response.tier,
+                                             self.handler.kb.generation)
+        body = self.encode_answer({"session_id": session_id, **response_fields(response)}, response)
+        return HTTPStatus.OK, [("Content-Type", JSON_CONTENT_TYPE)], body
+
+    async def answer_stream(self, question, session_id):
+        """الرد كسطور JSON تُكتب جزءاً جزءاً (التحليل يجري في منفذ الخيوط)"""
+        loop = asyncio.get_running_loop()
+        streamed = await loop.run_in_executor(None, self.handler.respond_stream, question)
+        self.sessions.get(session_id).append(question.strip(), streamed.response_id, streamed.tier,
+                                             self.handler.kb.generation)
+        
+        def lines():
+            yield json_line({
+                "session_id": session_id,
+                "intent": streamed.analysis.intent,
+                "topic": streamed.analysis.topic,
+                "confidence": round(streamed.analysis.confidence, 4),
+                "tier": streamed.tier,
+                "response_id": streamed.response_id,
+            })
+            for section in streamed.sections:
+                yield json_line({"section": section})
+        
+        return HTTPStatus.OK, [("Content-Type", NDJSON_CONTENT_TYPE)], lines()
+
+    async def batch(self, request):
+        data = request.json()
+        questions = data.get("questions")
+        if not isinstance(questions, list) or not all(isinstance(question, str) for question in questions):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "الحقل questions يجب أن يكون قائمة نصوص")
+        if len(questions) > MAX_BATCH_SIZE:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"أقصى عدد أسئلة في الطلب {MAX_BATCH_SIZE}")
+
+        responses = await self.handler.aprocess_batch(questions, max_workers=1)
+        answers = b", ".join(self.encode_answer(response_fields(response), response) for response in responses)
+        return HTTPStatus.OK, [("Content-Type", JSON_CONTENT_TYPE)], b'{"answers": [' + answers + b"]}"
+
+    async def history(self, request):
+        session_id = request.query.get("session_id", [None])[0] or request.headers.get("x-session-id")
+        if not session_id or session_id not in self.sessions.sessions:
+            raise HttpError(HTTPStatus.NOT_FOUND, "جلسة غير معروفة")
+        records = [record.to_dict() for record in self.sessions.get(session_id)]
+        return self.json_response({"session_id": session_id, "history": records})
+
+    async def metrics_endpoint(self, request):
+        body = self.handler.metrics.to_prometheus().encode("utf-8")
+        return HTTPStatus.OK, [("Content-Type", PROMETHEUS_CONTENT_TYPE)], body
+
+    async def health(self, request):
+        return self.json_response({
+            "status": "ok",
+            "generation": self.handler.kb.generation,
+            "pending": self.pending,
+            "connections": self.connections,
+            "sessions": len(self.sessions),
+        })
+
+    def encode_answer(self, fields, response):
+        """كائن JSON للرد: الحقول ثم "response"
+        
+        نص الرد يؤخذ مرمزاً من جدول الردود الجاهزة إذا كان نفس النص،
+        فلا يُعاد ترميز عدة كيلوبايتات لكل طلب.
+        """
+        rendered = self.handler.kb.snapshot.rendered.get(response.response_id)
+        if rendered is not None and rendered.text is response.text:
+            text_json = rendered.json
+        else:
+            text_json = json.dumps(response.text, ensure_ascii=False).encode("utf-8")
+        return json.dumps(fields, ensure_ascii=False).encode("utf-8")[:-1] + b', "response": ' + text_json + b"}"
+
+    def json_response(self, data, status=HTTPStatus.OK, headers=()):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        return status, [("Content-Type", JSON_CONTENT_TYPE), *headers], body
+
+    def error_response(self, error):
+        return self.json_response({"error": error.message}, error.status, error.headers)
+
+    async def send_error(self, writer, error, keep_alive):
+        status, headers, body = self.error_response(error)
+        await self.send(writer, status, headers, body, keep_alive)
+
+    async def send(self, writer, status, headers, body, keep_alive, chunked=True):
+        """كتابة الرد وانتظار تفريغه (العميل البطيء يوقف اتصاله فقط)
+        
+        body نص بايتات أو مولد أجزاء بايتات؛ المولد يُرسل مجزأً (chunked)
+        لعملاء HTTP/1.1 ويُجمع لغيرهم.
+        """
+        streaming = not isinstance(body, bytes)
+        if streaming and not chunked:
+            body = b"".join(body)
+            streaming = False
+        
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            *(f"{name}: {value}" for name, value in headers),
+            "Transfer-Encoding: chunked" if streaming else f"Content-Length: {len(body)}",
+            "Connection: keep-alive" if keep_alive else "Connection: close",
+        ]
+        if keep_alive:
+            lines.append(f"Keep-Alive: timeout={int(self.keep_alive_timeout)}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        
+        if not streaming:
+            writer.write(head + body)
+            await asyncio.wait_for(writer.drain(), self.request_timeout)
+            return
+        
+        writer.write(head)
+        try:
+            for chunk in body:
+                if chunk:
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    await asyncio.wait_for(writer.drain(), self.request_timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            raise
+        except Exception:
+            # الحالة أُرسلت بالفعل، فيُقطع الاتصال دون الجزء الأخير ليعرف العميل أن الرد ناقص
+            logger.exception("خطأ أثناء إرسال رد مجزأ")
+            raise ConnectionAbortedError
+        writer.write(b"0\r\n\r\n")
+        await asyncio.wait_for(writer.drain(), self.request_timeout)
+
+
+def json_line(data):
+    """سطر JSON واحد كبايتات (لصيغة NDJSON)"""
+    return json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def response_fields(response):
+    """حقول الرد المنظم عدا النص"""
+    return {
+        "intent": response.analysis.intent,
+        "topic": response.analysis.topic,
+        "confidence": round(response.analysis.confidence, 4),
+        "tier": response.tier,
+        "response_id": response.response_id,
+    }
+
+
+def build_server(args):
+    """بناء الخادم فوق الموارد المشتركة للعملية"""
+    resources = get_shared_resources(args.kb, index_path=args.index)
+    if args.watch:
+        resources.knowledge_base.start_watching()
+
+    profiler = None
+    if args.profile_rate > 0 or args.allow_profile:
+        profiler = RequestProfiler(args.profile_dir, args.profile_rate, args.profile_mode)
+
+    handler = AdvancedResponseHandler(
+        resources.knowledge_base,
+        intent_analyzer=resources.intent_analyzer,
+        # التاريخ محفوظ لكل جلسة في الخادم وليس في المعالج المشترك
+        history=ConversationHistory(max_records=0),
+        response_cache=resources.response_cache,
+        profiler=profiler,
+    )
+    return ChatServer(
+        handler,
+        SessionStore(args.max_sessions),
+        max_pending=args.max_pending,
+        max_connections=args.max_connections,
+        request_timeout=args.request_timeout,
+        keep_alive_timeout=args.keep_alive_timeout,
+    )
+
+
+async def serve(args):
+    """تشغيل الخادم حتى SIGINT أو SIGTERM"""
+    chat_server = build_server(args)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix="chatbot"))
+
+    server = await asyncio.start_server(
+        chat_server.handle_connection, args.host, args.port,
+        limit=MAX_LINE_BYTES, backlog=args.backlog,
+    )
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: KeyboardInterrupt يوقف asyncio.run
+            pass
+
+    addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    logger.warning("🚀 الخادم يعمل على %s", addresses)
+    started = time.monotonic()
+    async with server:
+        await stop.wait()
+    logger.warning("تم إيقاف الخادم بعد %.0f ثانية", time.monotonic() - started)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="خادم HTTP/JSON للإجابة عن الأسئلة")
+    parser.add_argument("--host", default="127.0.0.1", help="عنوان الاستماع")
+    parser.add_argument("--port", type=int, default=8000, help="منفذ الاستماع")
+    parser.add_argument("--kb", default="after_cleaning.txt", help="ملف الدليل التربوي")
+    parser.add_argument("--index", help="ملف الفهرس المجمع (الافتراضي بجوار ملف الدليل)")
+    parser.add_argument("--watch", action="store_true", help="إعادة تحميل قاعدة المعرفة عند تعديل مصادرها")
+    parser.add_argument("--threads", type=int, default=8, help="عدد خيوط الحساب")
+    parser.add_argument("--max-pending", type=int, default=256, help="أقصى عدد طلبات قيد المعالجة قبل الرد بـ 503")
+    parser.add_argument("--max-connections", type=int, default=1024, help="أقصى عدد اتصالات مفتوحة")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="أقصى عدد جلسات محفوظة التاريخ")
+    parser.add_argument("--backlog", type=int, default=512, help="طول طابور الاتصالات في نظام التشغيل")
+    parser.add_argument("--request-timeout", type=float, default=REQUEST_TIMEOUT, help="مهلة معالجة الطلب بالثواني")
+    parser.add_argument("--keep-alive-timeout", type=float, default=KEEP_ALIVE_TIMEOUT,
+                        help="مهلة انتظار الطلب التالي على الاتصال المفتوح")
+    parser.add_argument("--log-level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="مستوى السجلات على stderr")
+    parser.add_argument("--profile-rate", type=float, default=0.0,
+                        help="نسبة الطلبات التي يُسجل لها ملف أداء (0 لإيقاف التسجيل)")
+    parser.add_argument("--allow-profile", action="store_true",
+                        help='تسجيل ملف أداء للطلبات التي تحمل "profile": true حتى مع نسبة 0')
+    parser.add_argument("--profile-mode", default="cprofile", choices=PROFILE_MODES, help="نوع ملفات الأداء")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="مجلد ملفات الأداء")
+    args = parser.parse_args(argv)
+    args.index = args.index or default_index_path(args.kb)
+    return args
+
+
+def main(argv=None):
+    """تشغيل الخادم من سطر الأوامر"""
+    args = parse_args(argv)
+    metrics.configure_logging(getattr(logging, args.log_level))
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import os
+import threading
+from collections import namedtuple
+
+from knowledge_base import SpecializedKnowledgeBase
+from question_intent_analyzer import QuestionIntentAnalyzer
+from response_cache import ResponseCache
+
+# الأجزاء الثابتة المشتركة بين كل الجلسات: للقراءة فقط بعد البناء وآمنة بين الخيوط
+SharedResources = namedtuple("SharedResources", ["knowledge_base", "intent_analyzer", "response_cache"])
+
+_resources = {}
+_resources_lock = threading.Lock()
+
+
+def get_shared_resources(file_path, index_path=None):
+    """تحميل قاعدة المعرفة والمحلل مرة واحدة لكل عملية وإعادة نفس النسخة بعدها"""
+    key = (os.path.abspath(file_path), index_path and os.path.abspath(index_path))
+
+    resources = _resources.get(key)
+    if resources is None:
+        with _resources_lock:
+            resources = _resources.get(key)
+            if resources is None:
+                resources = SharedResources(
+                    SpecializedKnowledgeBase(file_path, index_path=index_path),
+                    QuestionIntentAnalyzer(),
+                    ResponseCache(),
+                )
+                _resources[key] = resources
+
+    return resources
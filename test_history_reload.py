@@ -0,0 +1,57 @@
+"""تاريخ المحادثة بعد إعادة تحميل قاعدة المعرفة (python -m unittest test_history_reload)"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from conversation_history import ConversationHistory
+from knowledge_base import SpecializedKnowledgeBase
+from respond_handler import HISTORY_RESPONSE_UNAVAILABLE, AdvancedResponseHandler, TIER_PASSAGE
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASSAGE_QUESTION = "ازاي اعلم ابني الجمع والطرح"
+
+
+class HistoryAfterReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.manual_path = os.path.join(self.directory, "after_cleaning.txt")
+        knowledge_path = os.path.join(self.directory, "knowledge_base.json")
+        shutil.copy(os.path.join(PACKAGE_DIR, "after_cleaning.txt"), self.manual_path)
+        shutil.copy(os.path.join(PACKAGE_DIR, "knowledge_base.json"), knowledge_path)
+
+        self.kb = SpecializedKnowledgeBase(self.manual_path, knowledge_path=knowledge_path)
+        self.handler = AdvancedResponseHandler(self.kb, history=ConversationHistory())
+
+    def prepend_to_manual(self, lines):
+        with open(self.manual_path, encoding="utf-8") as file:
+            content = file.read()
+        with open(self.manual_path, "w", encoding="utf-8") as file:
+            file.write("".join(f"سطر مضاف رقم {number} في بداية الدليل\n" for number in range(lines)))
+            file.write(content)
+
+    def test_passage_answer_is_not_rendered_from_shifted_index(self):
+        response = self.handler.respond(PASSAGE_QUESTION)
+        self.assertEqual(response.tier, TIER_PASSAGE)
+        self.assertEqual(self.handler.get_conversation_history()[0]["response"], response.text)
+
+        self.prepend_to_manual(40)
+        self.kb.reload()
+
+        entry = self.handler.get_conversation_history()[0]
+        self.assertEqual(entry["generation"], 0)
+        self.assertEqual(entry["response"], HISTORY_RESPONSE_UNAVAILABLE)
+
+    def test_named_answers_survive_reload(self):
+        response = self.handler.respond("ازاي اعالج التشتت")
+        self.assertNotEqual(response.tier, TIER_PASSAGE)
+
+        self.prepend_to_manual(40)
+        self.kb.reload()
+
+        self.assertEqual(self.handler.get_conversation_history()[0]["response"], response.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,15 +7,25 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from arabic_normlizer import ArabicNormalizer
-    from question_intent_analyzer import QuestionIntentAnalyzer
-    from knowledge_base import SpecializedKnowledgeBase
+    from knowledge_base import default_index_path
+    from metrics import configure_logging
     from respond_handler import AdvancedResponseHandler
+    from shared_resources import get_shared_resources
 except ImportError as e:
     st.error(f"خطأ في استيراد الملفات المطلوبة: {e}")
     st.info("تأكد من وجود جميع الملفات المطلوبة في المستودع")
     st.stop()
 
+@st.cache_resource(show_spinner=False)
+def load_shared_resources():
+    """تحميل قاعدة المعرفة والمحلل مرة واحدة لكل العملية ومشاركتهما بين الجلسات"""
+    # سجلات إعادة التحميل والتحذيرات تُكتب من خيط خلفي لا من مسار الطلب
+    configure_logging()
+    resources = get_shared_resources("after_cleaning.txt", index_path=default_index_path("after_cleaning.txt"))
+    # تعديلات الدليل وقاعدة المعرفة تُحمّل في الخلفية دون إعادة تشغيل التطبيق
+    resources.knowledge_base.start_watching()
+    return resources
+
 class StreamlitChatBot:
     """شات بوت صعوبات التعلم مع Streamlit"""
     
@@ -23,21 +33,25 @@ class StreamlitChatBot:
         self.initialize_session_state()
         
     def initialize_session_state(self):
-        """تهيئة متغيرات الجلسة"""
+        """تهيئة متغيرات الجلسة (حالة المحادثة فقط، والباقي مشترك)"""
         if 'chatbot_initialized' not in st.session_state:
             try:
                 with st.spinner("🤖 جاري تحميل الشات بوت المحسن..."):
+                    resources = load_shared_resources()
                     st.session_state.chatbot_initialized = True
-                    st.session_state.normalizer = ArabicNormalizer()
-                    st.session_state.intent_analyzer = QuestionIntentAnalyzer()
-                    st.session_state.kb = SpecializedKnowledgeBase("after_cleaning.txt")
-                    st.session_state.response_handler = AdvancedResponseHandler(st.session_state.kb)
+                    st.session_state.response_handler = AdvancedResponseHandler(
+                        resources.knowledge_base,
+                        intent_analyzer=resources.intent_analyzer,
+                        response_cache=resources.response_cache,
+                    )
                     st.session_state.messages = []
                     st.session_state.conversation_count = 0
                 st.success("✅ تم تحميل الشات بوت بنجاح!")
             except Exception as e:
                 st.error(f"❌ خطأ في تهيئة النظام: {e}")
                 st.stop()
+        
+        self.resources = load_shared_resources()
     
     def run(self):
         """تشغيل التطبيق"""
@@ -108,7 +122,7 @@ class StreamlitChatBot:
             with col1:
                 if st.button("🗑️ مسح المحادثة", use_container_width=True):
                     st.session_state.messages = []
-                    st.session_state.response_handler.conversation_history = []
+                    st.session_state.response_handler.conversation_history.clear()
                     st.session_state.conversation_count = 0
                     st.rerun()
             
@@ -148,30 +162,28 @@ class StreamlitChatBot:
         # معالجة السؤال وإظهار التحليل
         with st.chat_message("assistant"):
             with st.spinner("🤖 جاري تحليل السؤال والبحث عن الإجابة..."):
-                # تحليل السؤال
-                intent = st.session_state.intent_analyzer.analyze_intent(user_input)
-                topic = st.session_state.intent_analyzer.extract_main_topic(user_input)
-                confidence = st.session_state.intent_analyzer.get_confidence_score(user_input, intent, topic)
-                
-                # عرض تحليل السؤال (اختياري)
-                with st.expander("🔍 تحليل السؤال (اضغط للعرض)", expanded=False):
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("النية المكتشفة", intent)
-                    with col2:
-                        st.metric("الموضوع المكتشف", topic or "غير محدد")
-                    with col3:
-                        st.metric("مستوى الثقة", f"{confidence:.2f}")
-                
-                # الحصول على الرد
-                response = st.session_state.response_handler.process_user_input(user_input)
-                
-                # عرض الرد
-                st.markdown(response)
-                
-                # حفظ الرد
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                st.session_state.conversation_count += 1
+                # التحليل واختيار الرد، والنص يُعرض بعدها جزءاً جزءاً
+                result = st.session_state.response_handler.respond_stream(user_input)
+                analysis = result.analysis
+            
+            # عرض تحليل السؤال (اختياري)
+            with st.expander("🔍 تحليل السؤال (اضغط للعرض)", expanded=False):
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("النية المكتشفة", analysis.intent)
+                with col2:
+                    st.metric("الموضوع المكتشف", analysis.topic or "غير محدد")
+                with col3:
+                    st.metric("مستوى الثقة", f"{analysis.confidence:.2f}")
+                with col4:
+                    st.metric("مصدر الرد", result.tier)
+            
+            # عرض الرد بالتدريج (الرد الأساسي ثم الاقتراحات)
+            response = st.write_stream(result.sections)
+            
+            # حفظ الرد
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.conversation_count += 1
     
     def run_system_test(self):
         """تشغيل اختبار النظام"""
@@ -187,8 +199,8 @@ class StreamlitChatBot:
         success_count = 0
         
         for i, (test_input, expected_intent, expected_topic) in enumerate(test_cases, 1):
-            intent = st.session_state.intent_analyzer.analyze_intent(test_input)
-            topic = st.session_state.intent_analyzer.extract_main_topic(test_input)
+            analysis = self.resources.intent_analyzer.analyze(test_input)
+            intent, topic = analysis.intent, analysis.topic
             
             intent_correct = intent == expected_intent
             topic_correct = topic == expected_topic
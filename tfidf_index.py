@@ -0,0 +1,118 @@
+import heapq
+import math
+from array import array
+
+from passage_index import tokenize
+
+
+def char_ngrams(normalized_text, n=3):
+    """حروف n المتتالية لكل كلمة مع حدودها، لتتحمل السوابق واللواحق وأخطاء الكتابة"""
+    grams = []
+    for token in tokenize(normalized_text):
+        padded = f" {token} "
+        grams.extend(padded[start:start + n] for start in range(len(padded) - n + 1))
+    return grams
+
+
+def term_frequencies(grams):
+    counts = {}
+    for gram in grams:
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def normalize_vector(vector):
+    """قسمة المتجه على طوله (L2) ليصبح الضرب النقطي تشابه جيب التمام"""
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {gram: weight / norm for gram, weight in vector.items()}
+
+
+class TfidfIndex:
+    """مصفوفة TF-IDF متفرقة لحروف n لمدخلات قاعدة المعرفة
+
+    كل مدخل متجه يجمع الكلمات المفتاحية والرد بأوزان مختلفة، والمصفوفة
+    مخزنة بالأعمدة (حروف n -> أرقام المدخلات وأوزانها)، فترتيب كل
+    المدخلات ضرب متفرق للمصفوفة في متجه السؤال يمر على أعمدة حروفه فقط.
+    """
+
+    NGRAM_SIZE = 3
+    # وزن كل حقل في متجه المدخل
+    KEYWORDS_WEIGHT = 0.7
+    RESPONSE_WEIGHT = 0.3
+
+    def __init__(self, documents=()):
+        # حروف n -> قيمة IDF
+        self.idf = {}
+        # حروف n -> (أرقام المدخلات، الأوزان)
+        self.postings = {}
+        self.document_count = 0
+
+        if documents:
+            self.build(documents)
+
+    def build(self, documents):
+        """بناء المصفوفة من المدخلات [(نص الكلمات المفتاحية، نص الرد)] المطبعة"""
+        fields = [
+            (term_frequencies(char_ngrams(keywords, self.NGRAM_SIZE)),
+             term_frequencies(char_ngrams(response, self.NGRAM_SIZE)))
+            for keywords, response in documents
+        ]
+        self.document_count = len(fields)
+
+        document_frequencies = {}
+        for keyword_counts, response_counts in fields:
+            for gram in keyword_counts.keys() | response_counts.keys():
+                document_frequencies[gram] = document_frequencies.get(gram, 0) + 1
+
+        self.idf = {
+            gram: math.log((1 + self.document_count) / (1 + frequency)) + 1
+            for gram, frequency in document_frequencies.items()
+        }
+
+        postings = {}
+        for document_id, (keyword_counts, response_counts) in enumerate(fields):
+            vector = {}
+            for counts, field_weight in (
+                (keyword_counts, self.KEYWORDS_WEIGHT),
+                (response_counts, self.RESPONSE_WEIGHT),
+            ):
+                for gram, weight in self.weigh(counts).items():
+                    vector[gram] = vector.get(gram, 0.0) + field_weight * weight
+
+            for gram, weight in normalize_vector(vector).items():
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = (array('I'), array('d'))
+                posting[0].append(document_id)
+                posting[1].append(weight)
+
+        self.postings = postings
+
+    def weigh(self, counts):
+        """أوزان TF-IDF (تكرار لوغاريتمي) لحروف n المعروفة بعد التطبيع"""
+        return normalize_vector({
+            gram: (1 + math.log(count)) * self.idf[gram]
+            for gram, count in counts.items()
+            if gram in self.idf
+        })
+
+    def vectorize(self, normalized_text):
+        """متجه السؤال بنفس أوزان المصفوفة"""
+        return self.weigh(term_frequencies(char_ngrams(normalized_text, self.NGRAM_SIZE)))
+
+    def similarities(self, normalized_query):
+        """تشابه السؤال مع كل مدخل يشترك معه في حروف n: {رقم المدخل: التشابه}"""
+        scores = {}
+        for gram, query_weight in self.vectorize(normalized_query).items():
+            document_ids, weights = self.postings[gram]
+            for document_id, weight in zip(document_ids, weights):
+                scores[document_id] = scores.get(document_id, 0.0) + query_weight * weight
+        return scores
+
+    def rank(self, normalized_query, top_k=3):
+        """أعلى المدخلات تشابهاً [(رقم المدخل، التشابه)] من الأعلى للأقل"""
+        scores = self.similarities(normalized_query)
+        # عند التعادل يفوز المدخل الأسبق
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))